@@ -1,18 +1,27 @@
-import os
-import google.generativeai as genai
+import threading
 from dotenv import load_dotenv
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import ORJSONResponse
 from contextlib import contextmanager, asynccontextmanager
-from src.database import engine
+from src import analytics, metrics, rollups, search, services, similarity, versions
+from src.config import settings
+from src.database import SessionLocal, engine
 from src.exception_handlers import setup_exception_handlers
 from src.models import Base
-from src.routers import crud_router, ai_router
+from src.routers import crud_router, versions_router, ai_router, transfer_router
 
 
 load_dotenv()
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        versions.upgrade_schema(db)
+        versions.ensure_migrated(db)
+        analytics.ensure_aggregates(db)
+        search.ensure_index(db)
+        similarity.ensure_index(db)
+        rollups.ensure_backfill(db)
 
 def dispose_db():
     engine.dispose()
@@ -24,10 +33,18 @@ def db_lifespan(app: FastAPI):
     dispose_db()
 
 def init_gemini():
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set.")
-    genai.configure(api_key=gemini_api_key)
+    services.get_gemini_model()
+
+def init_model():
+    # MODEL_INIT: "lazy" creates the client on the first summarize call,
+    # "background" right after startup, "startup" before serving (and
+    # fails fast without credentials).
+    if not services.ai_enabled() or settings.model_init == "lazy":
+        return
+    if settings.model_init == "startup":
+        init_gemini()
+    else:
+        threading.Thread(target=services.warm_model, name="model-warmup", daemon=True).start()
 
 @contextmanager
 def gemini_lifespan(app: FastAPI):
@@ -37,7 +54,7 @@ def gemini_lifespan(app: FastAPI):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    init_gemini()
+    init_model()
     yield
     dispose_db()
 
@@ -48,12 +65,21 @@ def create_app():
         description="API for managing notes with summarization and analytics.",
         version="0.1.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     setup_exception_handlers(app)
+    metrics.install(app)
+
+    if settings.db_async:
+        from src.async_routers import async_crud_router as notes_router
+    else:
+        notes_router = crud_router
 
     default_routers: list[APIRouter] = [
-        crud_router,
+        transfer_router,
+        notes_router,
+        versions_router,
         ai_router,
     ]
 
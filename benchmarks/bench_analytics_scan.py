@@ -0,0 +1,69 @@
+"""Memory/latency of the analytics scan at growing corpus sizes.
+
+    python -m benchmarks.bench_analytics_scan 10000 100000 1000000
+
+Compares the old ``db.query(Note).all()`` implementation with the streaming,
+column-projected scan and the vectorized batch kernel. Latency is wall time; peak memory is measured with tracemalloc in a
+separate run.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from collections import Counter
+from benchmarks.corpus import build_corpus, session_factory
+from src import crud, services
+
+
+def legacy_analyze_notes(db):
+    notes = crud.get_all_notes(db)
+    contents = [note.content for note in notes]
+    word_counts = [len(content.split()) for content in contents]
+    all_words = " ".join(contents).split()
+    Counter(all_words).most_common(5)
+    sorted(notes, key=lambda note: len(note.content.split()))
+    return sum(word_counts)
+
+
+def measure(fn, Session):
+    # Timed and traced separately: tracemalloc slows allocation-heavy code
+    # several-fold and would distort the latency numbers.
+    with Session() as db:
+        started = time.perf_counter()
+        fn(db)
+        elapsed = time.perf_counter() - started
+    with Session() as db:
+        tracemalloc.start()
+        fn(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'notes':>10} {'mode':>12} {'seconds':>10} {'peak MiB':>10}")
+    for size in args.sizes:
+        engine = build_corpus(size)
+        Session = session_factory(engine)
+        runs = {
+            "scan": lambda db: services.analyze_notes(db, mode="scan"),
+            "batch": lambda db: services.analyze_notes(db, mode="batch"),
+            "incremental": lambda db: services.analyze_notes(db, mode="incremental"),
+        }
+        if not args.skip_legacy:
+            runs["legacy"] = legacy_analyze_notes
+        for name, fn in runs.items():
+            elapsed, peak = measure(fn, Session)
+            print(f"{size:>10} {name:>12} {elapsed:>10.3f} {peak / 2**20:>10.1f}")
+        path = engine.url.database
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Request throughput of the sync and async CRUD stacks under concurrency.
+
+    python -m benchmarks.bench_async_db --notes 10000 --concurrency 200 --requests 5000
+
+Drives each app in-process through ``httpx.AsyncClient`` with a mixed load
+of 90% ``GET /notes/{id}`` and 10% ``PUT /notes/{id}`` and reports requests
+per second, p50/p99 latency and errors. The sync stack runs its endpoints
+in Starlette's thread pool; the async stack awaits aiosqlite.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import httpx
+from benchmarks.corpus import build_corpus, session_factory
+from app_init import create_app
+from src.config import settings
+from src.database import create_async_db_engine, create_db_engine, get_async_db, get_db
+
+
+def sync_app(path: str):
+    engine = create_db_engine(f"sqlite:///{path}")
+    Session = session_factory(engine)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    settings.db_async = False
+    app = create_app()
+    app.dependency_overrides[get_db] = override_get_db
+    return app, engine.dispose
+
+
+def async_app(path: str):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    engine = create_async_db_engine(f"sqlite:///{path}")
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with Session() as db:
+            yield db
+
+    settings.db_async = True
+    app = create_app()
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return app, engine.dispose
+
+
+async def load(app, args):
+    rng = random.Random(0)
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def request(client: httpx.AsyncClient):
+        nonlocal errors
+        note_id = rng.randint(1, args.notes)
+        async with semaphore:
+            start = time.perf_counter()
+            if rng.random() < 0.1:
+                response = await client.put(f"/notes/{note_id}", json={"content": f"edited {rng.random()}"})
+            else:
+                response = await client.get(f"/notes/{note_id}")
+            latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(request(client) for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": args.requests / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'stack':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, factory in (("sync", sync_app), ("async", async_app)):
+        seed_engine = build_corpus(args.notes)
+        path = seed_engine.url.database
+        seed_engine.dispose()
+        app, dispose = factory(path)
+        result = asyncio.run(load(app, args))
+        disposed = dispose()
+        if asyncio.iscoroutine(disposed):
+            asyncio.run(disposed)
+        print(f"{name:>6} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main()
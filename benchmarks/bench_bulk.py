@@ -0,0 +1,80 @@
+"""Write throughput: single-item routes against POST /notes:bulk.
+
+    python -m benchmarks.bench_bulk --notes 5000 --batch 500
+
+Runs the app in-process on a temporary SQLite file, creates ``--notes``
+notes, updates each once and deletes them all, first one request per
+note and then through the bulk endpoint.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from app_init import create_app
+from benchmarks.corpus import random_content, session_factory
+from src.database import get_db
+from src.models import Base
+
+
+def make_client(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = session_factory(engine)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app = create_app()
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app), engine
+
+
+def run_single(client, contents: list):
+    ids = [client.post("/notes/", json={"title": "t", "content": content}).json()["id"] for content in contents]
+    for note_id, content in zip(ids, reversed(contents)):
+        client.put(f"/notes/{note_id}", json={"content": content})
+    for note_id in ids:
+        client.delete(f"/notes/{note_id}")
+
+
+def run_bulk(client, contents: list, batch: int):
+    ids = []
+    for start in range(0, len(contents), batch):
+        operations = [{"op": "create", "title": "t", "content": content} for content in contents[start:start + batch]]
+        ids += [result["id"] for result in client.post("/notes:bulk", json={"operations": operations}).json()["results"]]
+    updates = [{"op": "update", "id": note_id, "content": content} for note_id, content in zip(ids, reversed(contents))]
+    deletes = [{"op": "delete", "id": note_id} for note_id in ids]
+    for operations in (updates, deletes):
+        for start in range(0, len(operations), batch):
+            client.post("/notes:bulk", json={"operations": operations[start:start + batch]})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    contents = [random_content(rng) for _ in range(args.notes)]
+    runs = {"single": lambda client: run_single(client, contents), "bulk": lambda client: run_bulk(client, contents, args.batch)}
+    operations = args.notes * 3
+    print(f"{'path':>8} {'ops':>8} {'seconds':>9} {'ops/s':>10}")
+    for name, run in runs.items():
+        fd, path = tempfile.mkstemp(prefix="notes-bench-", suffix=".db")
+        os.close(fd)
+        client, engine = make_client(path)
+        started = time.perf_counter()
+        run(client)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>8} {operations:>8} {elapsed:>9.2f} {operations / elapsed:>10.0f}")
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
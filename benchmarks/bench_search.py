@@ -0,0 +1,67 @@
+"""Full-text search latency against corpus size.
+
+    python -m benchmarks.bench_search 1000000
+
+Builds a synthetic corpus, indexes it with FTS5 and times
+``search.search_notes`` for rare, common and multi-term queries. The LIKE
+fallback used on non-SQLite backends is timed for comparison
+(skip it with --skip-fallback on large corpora).
+"""
+import argparse
+import os
+import statistics
+import time
+from benchmarks.corpus import build_corpus, session_factory
+from src import search
+
+QUERIES = ["word42", "word1", "word7 word8", "word4999 word3"]
+
+
+def time_queries(db, repeat: int):
+    results = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            search.search_notes(db, query, limit=20)
+            samples.append(time.perf_counter() - started)
+        results[query] = samples
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-fallback", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'notes':>10} {'engine':>9} {'query':>18} {'p50 ms':>9} {'max ms':>9}")
+    for size in args.sizes:
+        engine = build_corpus(size)
+        Session = session_factory(engine)
+        with Session() as db:
+            started = time.perf_counter()
+            search.rebuild(db)
+            print(f"{size:>10} index rebuild {time.perf_counter() - started:.2f}s")
+            runs = {"fts5": time_queries(db, args.repeat)}
+            if not args.skip_fallback:
+                original = search.uses_fts
+                search.uses_fts = lambda db: False
+                try:
+                    runs["like"] = time_queries(db, max(1, args.repeat // 10))
+                finally:
+                    search.uses_fts = original
+        for name, results in runs.items():
+            for query, samples in results.items():
+                print(
+                    f"{size:>10} {name:>9} {query:>18} "
+                    f"{statistics.median(samples) * 1000:>9.2f} {max(samples) * 1000:>9.2f}"
+                )
+        path = engine.url.database
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Serialization cost of note responses.
+
+    python -m benchmarks.bench_serialization --notes 1000 --repeat 200
+
+Compares, for one note and for a page of ``--notes`` notes:
+
+* ``stdlib``: FastAPI's default path, ``jsonable_encoder`` over the
+  validated model followed by ``json.dumps``;
+* ``pydantic``: ``model_validate`` + ``model_dump_json`` (the single-note
+  routes);
+* ``orjson``: ``orjson.dumps`` over plain row dicts (the list route).
+"""
+import argparse
+import datetime
+import json
+import random
+import timeit
+import orjson
+from fastapi.encoders import jsonable_encoder
+from benchmarks.corpus import random_content
+from src import schemas
+from src.models import Note
+
+
+def make_notes(count: int):
+    rng = random.Random(0)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    notes = []
+    for i in range(count):
+        content = random_content(rng)
+        notes.append(Note(
+            id=i + 1, title=f"Note {i}", content=content, word_count=len(content.split()), revision=1,
+            created_at=now, updated_at=now,
+        ))
+    return notes
+
+
+def row(note):
+    return {field: getattr(note, field) for field in ("id", "title", "content", "word_count", "created_at", "updated_at")}
+
+
+def stdlib(notes):
+    return json.dumps(jsonable_encoder([schemas.Note.model_validate(note) for note in notes])).encode()
+
+
+def pydantic(notes):
+    return b"[" + b",".join(schemas.Note.model_validate(note).model_dump_json().encode() for note in notes) + b"]"
+
+
+def fast(rows):
+    return orjson.dumps(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    notes = make_notes(args.notes)
+    rows = [row(note) for note in notes]
+    print(f"{'payload':>12} {'stdlib':>10} {'pydantic':>10} {'orjson':>10}   (microseconds per response)")
+    for label, count in (("1 note", 1), (f"{args.notes} notes", args.notes)):
+        repeat = max(1, args.repeat * 100 // count)
+        timings = [
+            timeit.timeit(lambda: stdlib(notes[:count]), number=repeat),
+            timeit.timeit(lambda: pydantic(notes[:count]), number=repeat),
+            timeit.timeit(lambda: fast(rows[:count]), number=repeat),
+        ]
+        print(f"{label:>12} " + " ".join(f"{seconds / repeat * 1e6:>10.1f}" for seconds in timings))
+
+
+if __name__ == "__main__":
+    main()
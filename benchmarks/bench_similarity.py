@@ -0,0 +1,114 @@
+"""Similarity index build time and query latency against corpus size.
+
+    python -m benchmarks.bench_similarity --sizes 1000 10000 50000 --queries 200
+
+For each size a corpus is built, ``--duplicates`` of its notes get an
+edited copy (one word in ``--edit-every`` replaced) through
+``crud.bulk_apply``, then the benchmark times ``similarity.rebuild``,
+``similar_notes`` for random notes (p50/p95) and the duplicate-cluster
+report, and reports the share of injected copies with a true shingle
+Jaccard similarity above ``--threshold`` that the report found.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from sqlalchemy import select
+from benchmarks.corpus import build_corpus, session_factory
+from src import crud, similarity
+from src.models import Note
+
+
+def edited(content: str, rng: random.Random, every: int):
+    words = content.split()
+    for i in range(0, len(words), every):
+        words[rng.randrange(i, min(i + every, len(words)))] = f"edit{rng.randrange(1000)}"
+    return " ".join(words)
+
+
+def jaccard(first: str, second: str):
+    first, second = similarity.shingles(first), similarity.shingles(second)
+    return len(first & second) / len(first | second)
+
+
+def run(size: int, args):
+    rng = random.Random(size)
+    engine = build_corpus(size)
+    path = engine.url.database
+    Session = session_factory(engine)
+    try:
+        with Session() as db:
+            originals = db.execute(
+                select(Note.id, Note.content).where(Note.word_count >= 50).limit(int(size * args.duplicates))
+            ).all()
+            copies = [edited(content, rng, args.edit_every) for _, content in originals]
+            results = crud.bulk_apply(db, [
+                {"op": "create", "title": f"Copy of {note_id}", "content": copy}
+                for (note_id, _), copy in zip(originals, copies)
+            ])
+            # Recall only counts copies that are truly above the threshold.
+            injected = {
+                (note_id, result["id"])
+                for (note_id, content), copy, result in zip(originals, copies, results)
+                if jaccard(content, copy) >= args.threshold
+            }
+
+            start = time.perf_counter()
+            similarity.rebuild(db)
+            build = time.perf_counter() - start
+
+            ids = db.execute(select(Note.id)).scalars().all()
+            latencies = []
+            for note_id in rng.sample(ids, min(args.queries, len(ids))):
+                note = db.get(Note, note_id)
+                start = time.perf_counter()
+                similarity.similar_notes(db, note, threshold=args.threshold)
+                latencies.append(time.perf_counter() - start)
+                db.expunge(note)
+            latencies.sort()
+
+            start = time.perf_counter()
+            clusters = similarity.duplicate_clusters(db, threshold=args.threshold, limit=len(ids))
+            report = time.perf_counter() - start
+            linked = {}
+            for index, cluster in enumerate(clusters):
+                for note in cluster["notes"]:
+                    linked[note["id"]] = index
+            found = sum(1 for first, second in injected if first in linked and linked[first] == linked.get(second))
+    finally:
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return {
+        "notes": len(ids),
+        "build_s": build,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "report_s": report,
+        "recall": found / len(injected) if injected else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="Fraction of notes given an edited copy.")
+    parser.add_argument("--edit-every", type=int, default=50, help="Replace one word in every N.")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    print(f"{'notes':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'report s':>9} {'recall':>7}")
+    for size in args.sizes:
+        result = run(size, args)
+        print(
+            f"{result['notes']:>8} {result['build_s']:>8.2f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['mean_ms']:>8.2f} {result['report_s']:>9.2f} {result['recall']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
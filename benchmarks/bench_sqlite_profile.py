@@ -0,0 +1,81 @@
+"""Concurrent read/write load against the default and tuned SQLite profiles.
+
+    python -m benchmarks.bench_sqlite_profile --notes 10000 --readers 8 --writers 2 --seconds 10
+
+Reader threads fetch random notes by id; writer threads update random
+notes through ``crud.update_note``. Reports completed operations per
+second and errors (e.g. "database is locked") for each profile.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from sqlalchemy.exc import OperationalError
+from benchmarks.corpus import build_corpus, session_factory
+from src import crud
+from src.database import create_db_engine
+
+
+def worker(Session, kind: str, notes: int, deadline: float, counters: dict, lock: threading.Lock, seed: int):
+    rng = random.Random(seed)
+    done = errors = 0
+    while time.perf_counter() < deadline:
+        note_id = rng.randint(1, notes)
+        try:
+            with Session() as db:
+                if kind == "read":
+                    crud.get_note(db, note_id)
+                else:
+                    crud.update_note(db, note_id, f"edited {rng.random()}")
+            done += 1
+        except OperationalError:
+            errors += 1
+    with lock:
+        counters[kind] += done
+        counters[f"{kind}_errors"] += errors
+
+
+def run(profile: str, path: str, args):
+    engine = create_db_engine(f"sqlite:///{path}", profile=profile)
+    Session = session_factory(engine)
+    counters = {"read": 0, "write": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(Session, kind, args.notes, deadline, counters, lock, seed))
+        for seed, kind in enumerate(["read"] * args.readers + ["write"] * args.writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'read err':>9} {'write err':>10}")
+    for profile in ("default", "tuned"):
+        seed_engine = build_corpus(args.notes)
+        path = seed_engine.url.database
+        seed_engine.dispose()
+        counters = run(profile, path, args)
+        print(
+            f"{profile:>8} {counters['read'] / args.seconds:>9.0f} {counters['write'] / args.seconds:>9.0f} "
+            f"{counters['read_errors']:>9} {counters['write_errors']:>10}"
+        )
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Cold-start budget: time to import the app and build it.
+
+    python -m benchmarks.bench_startup --repeat 5 --budget-ms 1500
+    python -m benchmarks.bench_startup --top 15
+
+Each run is a fresh interpreter executing ``import main`` (which calls
+``create_app()``) under ``python -X importtime``. Reports the median wall
+time and the slowest imports by cumulative time, and exits with status 1
+when the median exceeds ``--budget-ms`` or a module from ``FORBIDDEN`` was
+loaded: with the default ``MODEL_INIT=lazy`` the model SDK must not be
+imported until the first summarize call.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+FORBIDDEN = ("google.generativeai", "grpc")
+PROBE = (
+    "import sys, time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start); "
+    "print(','.join(m for m in sys.modules if m.split('.')[0] in {'google', 'grpc'}))"
+)
+
+
+def run_once():
+    env = dict(os.environ, DATABASE_URL="sqlite:///:memory:", MODEL_INIT="lazy")
+    env.pop("GEMINI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE], env=env, capture_output=True, text=True, check=True
+    )
+    seconds, modules = result.stdout.splitlines()[-2:]
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), name.strip()))
+    return float(seconds), set(filter(None, modules.split(","))), imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.repeat):
+        seconds, loaded, imports = run_once()
+        timings.append(seconds * 1000)
+    median = statistics.median(timings)
+
+    print(f"import main: median {median:.0f} ms, min {min(timings):.0f} ms over {args.repeat} runs")
+    print("slowest imports (cumulative, last run):")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median {median:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    forbidden = sorted(name for name in loaded if name.startswith(FORBIDDEN))
+    if forbidden:
+        failures.append(f"model SDK imported at startup: {', '.join(forbidden[:5])}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Version storage size and reconstruction latency: full copies vs deltas.
+
+    python -m benchmarks.bench_versions --words 5000 --edits 200
+
+Edits one large note ``--edits`` times (a few words changed per edit) and
+compares the bytes a full-content copy per version would take with the
+delta/snapshot rows actually written, then times reconstructing the
+oldest, middle and newest versions.
+"""
+import argparse
+import random
+import time
+from sqlalchemy import create_engine, func, select
+from benchmarks.corpus import VOCABULARY, session_factory
+from src import crud, versions
+from src.config import settings
+from src.models import Base, NoteVersion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = session_factory(engine)
+    rng = random.Random(0)
+    words = rng.choices(VOCABULARY, k=args.words)
+    full_bytes = 0
+    with Session() as db:
+        note = crud.create_note(db, "Large note", " ".join(words))
+        start = time.perf_counter()
+        for _ in range(args.edits):
+            full_bytes += len(note.content.encode("utf-8"))
+            for _ in range(3):
+                words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+            crud.update_note(db, note.id, " ".join(words))
+        write_ms = (time.perf_counter() - start) * 1000 / args.edits
+
+        stored_bytes, snapshots = db.execute(
+            select(func.sum(func.length(NoteVersion.delta)), func.count().filter(NoteVersion.is_snapshot))
+        ).one()
+        print(f"versions: {args.edits}  snapshot interval: {settings.version_snapshot_interval}  snapshots: {snapshots}")
+        print(f"full copies: {full_bytes / 1024:>10.1f} KiB")
+        print(f"delta rows:  {stored_bytes / 1024:>10.1f} KiB  ({full_bytes / stored_bytes:.1f}x smaller)")
+        print(f"update_note: {write_ms:>10.2f} ms per edit")
+
+        for label, revision in (("oldest", 1), ("middle", args.edits // 2), ("newest", args.edits)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                versions.version_content(db, note, revision)
+            elapsed = (time.perf_counter() - start) * 1000 / args.repeat
+            print(f"reconstruct {label:>6} (r{revision}): {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import random
+import tempfile
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from src import analytics, rollups, search, similarity
+from src.models import Base, Note
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+INSERT_BATCH_SIZE = 10000
+
+
+def random_content(rng: random.Random, min_words: int = 5, max_words: int = 200):
+    return " ".join(rng.choices(VOCABULARY, k=rng.randint(min_words, max_words)))
+
+
+def generate_notes(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(count):
+        content = random_content(rng)
+        yield {"title": f"Note {i}", "content": content, "word_count": len(content.split())}
+
+
+def build_corpus(count: int, path: str = None, seed: int = 0):
+    """Create a SQLite file with ``count`` synthetic notes and return its engine.
+
+    Rows are bulk-inserted behind the CRUD layer, so the derived structures
+    (analytics aggregates and rollups, search and similarity indexes) are rebuilt
+    afterwards.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="notes-bench-", suffix=".db")
+        os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    batch = []
+    with engine.begin() as conn:
+        for row in generate_notes(count, seed):
+            batch.append(row)
+            if len(batch) == INSERT_BATCH_SIZE:
+                conn.execute(insert(Note), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Note), batch)
+    with session_factory(engine)() as db:
+        analytics.rebuild(db)
+        search.rebuild(db)
+        similarity.rebuild(db)
+        rollups.rebuild(db)
+    return engine
+
+
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,228 @@
+"""Load-test suite for the Notes API with baseline comparison.
+
+    python -m benchmarks.suite --notes 10000 --requests 2000 --concurrency 32
+    python -m benchmarks.suite --server uvicorn --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.25
+
+Builds a synthetic corpus, then drives ``create_app()`` either in-process
+(``httpx`` over ASGI) or over a real ``uvicorn`` server with one scenario
+per hot route: note reads, list pages, creates, updates, ``/analytics/``
+and summarize with the fake model injecting ``--model-latency`` seconds per
+call. Reports req/s, p50/p95/p99 latency, errors and peak RSS per scenario.
+
+With ``--baseline`` every scenario is compared against the stored results;
+a throughput drop or p99 rise beyond ``--tolerance`` is flagged and the
+exit status is 1. ``benchmarks/baseline.json`` was recorded in-process with
+``--notes 10000 --requests 1000``; re-record it on the machine that runs
+the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.corpus import build_corpus, random_content, session_factory
+from src import llm, services
+
+SCENARIOS = ("read", "list", "create", "update", "analytics", "summarize")
+
+
+def request_for(scenario: str, rng: random.Random, notes: int):
+    if scenario == "read":
+        return "GET", f"/notes/{rng.randint(1, notes)}", None
+    if scenario == "list":
+        return "GET", "/notes/", None
+    if scenario == "create":
+        return "POST", "/notes/", {"title": "Bench", "content": random_content(rng)}
+    if scenario == "update":
+        return "PUT", f"/notes/{rng.randint(1, notes)}", {"content": random_content(rng)}
+    if scenario == "analytics":
+        return "GET", "/analytics/", None
+    return "POST", f"/notes/{rng.randint(1, notes)}/summarize", None
+
+
+def peak_rss_kib(pid: int = None):
+    """Peak resident set size of ``pid`` (default: this process)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if pid is None else None
+
+
+def percentile(ordered: list, fraction: float):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, args):
+    rng = random.Random(scenario)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        method, url, body = request_for(scenario, rng, args.notes)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+        errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": args.requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+
+def in_process_client(path: str, args):
+    from app_init import create_app
+    from src.database import create_db_engine, get_db, get_session_factory
+
+    engine = create_db_engine(f"sqlite:///{path}")
+    Session = session_factory(engine)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    services.model = llm.FakeModel(latency=args.model_latency)
+    services.summary_cache.clear()
+    app = create_app()
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: Session
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60), engine.dispose
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(path: str, args):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{path}",
+        MODEL_PROVIDER="fake",
+        FAKE_MODEL_LATENCY=str(args.model_latency),
+        GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "benchmark"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/notes/1", timeout=1)
+            return server, port
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for scenario, result in results.items():
+        reference = baseline.get(scenario)
+        if not reference:
+            continue
+        if result["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: {result['rps']:.0f} req/s vs baseline {reference['rps']:.0f}")
+        if result["p99_ms"] > reference["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p99 {result['p99_ms']:.1f} ms vs baseline {reference['p99_ms']:.1f}")
+    return regressions
+
+
+async def run(args, path: str):
+    server = None
+    if args.server == "uvicorn":
+        server, port = start_server(path, args)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+        dispose = None
+    else:
+        client, dispose = in_process_client(path, args)
+    results = {}
+    try:
+        async with client:
+            for scenario in args.scenarios:
+                results[scenario] = await run_scenario(client, scenario, args)
+                results[scenario]["peak_rss_kib"] = peak_rss_kib(server.pid if server else None)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if dispose:
+            dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--baseline", help="JSON results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save-baseline", help="Write this run's results to the given JSON file.")
+    args = parser.parse_args()
+
+    engine = build_corpus(args.notes)
+    path = engine.url.database
+    engine.dispose()
+    try:
+        results = asyncio.run(run(args, path))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"{'scenario':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'peak RSS MiB':>13}")
+    for scenario, result in results.items():
+        rss = result["peak_rss_kib"]
+        print(
+            f"{scenario:>10} {result['rps']:>8.0f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+            f"{result['p99_ms']:>8.1f} {result['errors']:>7} {rss / 1024 if rss else float('nan'):>13.1f}"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
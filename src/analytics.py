@@ -0,0 +1,201 @@
+import datetime
+import functools
+import sys
+from collections import Counter
+from sqlalchemy import bindparam, select, delete, update, func
+from sqlalchemy.orm import Session
+from src import rollups
+from src.database import dialect_insert
+from src.models import Note, WordFrequency, AnalyticsTotals
+
+TOTALS_ID = 1
+# Core update: the ORM bulk form would require the version_id_col.
+SET_WORD_COUNT = update(Note.__table__).where(Note.__table__.c.id == bindparam("b_id"))
+REBUILD_BATCH_SIZE = 1000
+
+
+def tokenize(content: str):
+    return content.split() if content else []
+
+
+@functools.lru_cache(maxsize=None)
+def load_stop_words(language: str = "english"):
+    """NLTK stop words for ``language``.
+
+    Raises ``LookupError`` when the corpus has not been downloaded
+    (``python -m nltk.downloader stopwords``).
+    """
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words(language))
+
+
+def most_common(frequencies: Counter, n: int, stop_words: frozenset = frozenset()):
+    if not stop_words:
+        return frequencies.most_common(n)
+    return Counter(
+        {word: count for word, count in frequencies.items() if word.lower() not in stop_words}
+    ).most_common(n)
+
+
+def _upsert_word_counts(db: Session, delta: dict):
+    if not delta:
+        return
+    insert = dialect_insert(db)
+    stmt = insert(WordFrequency)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WordFrequency.word],
+        set_={"count": WordFrequency.count + stmt.excluded.count},
+    )
+    db.execute(stmt, [{"word": word, "count": count} for word, count in delta.items()])
+
+    removed = [word for word, count in delta.items() if count < 0]
+    if removed:
+        db.execute(
+            delete(WordFrequency)
+            .where(WordFrequency.word.in_(removed), WordFrequency.count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _update_totals(db: Session, note_delta: int, word_delta: int):
+    if not note_delta and not word_delta:
+        return
+    insert = dialect_insert(db)
+    stmt = insert(AnalyticsTotals).values(
+        id=TOTALS_ID, note_count=note_delta, total_word_count=word_delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AnalyticsTotals.id],
+        set_={
+            "note_count": AnalyticsTotals.note_count + stmt.excluded.note_count,
+            "total_word_count": AnalyticsTotals.total_word_count + stmt.excluded.total_word_count,
+        },
+    )
+    db.execute(stmt)
+
+
+def record_change(db: Session, old_content, new_content, note_delta: int = 0):
+    """Stage the aggregate updates for a note whose content goes from
+    ``old_content`` to ``new_content`` and return the new word count.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    return record_changes(db, [(old_content, new_content)], note_delta)[0]
+
+
+def record_changes(db: Session, changes: list, note_delta: int = 0, rollup: bool = True):
+    """Batch form of ``record_change``: ``changes`` is a list of
+    ``(old_content, new_content)`` pairs folded into one upsert. Returns the
+    new word count of each pair.
+
+    A ``None`` old or new content is a created or deleted note. With
+    ``rollup`` the changes also count towards the current hour and day in
+    src/rollups.py; imports pass ``False`` and record their own timestamps.
+    """
+    delta = Counter()
+    word_counts = []
+    word_delta = 0
+    created = sum(1 for old_content, new_content in changes if old_content is None and new_content is not None)
+    deleted = sum(1 for _, new_content in changes if new_content is None)
+    for old_content, new_content in changes:
+        old_words = tokenize(old_content)
+        new_words = tokenize(new_content)
+        delta.update(new_words)
+        delta.subtract(old_words)
+        word_delta += len(new_words) - len(old_words)
+        word_counts.append(len(new_words))
+    _upsert_word_counts(db, {word: count for word, count in delta.items() if count})
+    _update_totals(db, note_delta, word_delta)
+    if rollup:
+        rollups.record(
+            db, datetime.datetime.now(datetime.timezone.utc), created, len(changes) - created - deleted, deleted, delta
+        )
+    return word_counts
+
+
+def get_snapshot(db: Session, k: int = 3, stop_words: frozenset = frozenset()):
+    totals = db.get(AnalyticsTotals, TOTALS_ID)
+    if not totals or not totals.note_count:
+        return None
+
+    words_query = select(WordFrequency.word, WordFrequency.count)
+    if stop_words:
+        words_query = words_query.where(func.lower(WordFrequency.word).not_in(stop_words))
+    most_common_words = db.execute(
+        words_query.order_by(WordFrequency.count.desc(), WordFrequency.word).limit(5)
+    ).all()
+    longest = db.execute(
+        select(Note.id, Note.word_count).order_by(Note.word_count.desc(), Note.id).limit(k)
+    ).all()
+    shortest = db.execute(
+        select(Note.id, Note.word_count).order_by(Note.word_count, Note.id).limit(k)
+    ).all()
+
+    return {
+        "total_word_count": totals.total_word_count,
+        "average_note_length": totals.total_word_count / totals.note_count,
+        "most_common_words": [(word, count) for word, count in most_common_words],
+        "top_3_longest_notes": [{"id": note_id, "length": length} for note_id, length in longest],
+        "top_3_shortest_notes": [{"id": note_id, "length": length} for note_id, length in shortest],
+    }
+
+
+def ensure_aggregates(db: Session):
+    """Rebuild the aggregates if they do not cover every note, e.g. on a
+    database created before they existed."""
+    totals = db.get(AnalyticsTotals, TOTALS_ID)
+    notes = db.execute(select(func.count()).select_from(Note)).scalar()
+    if (totals.note_count if totals else 0) == notes:
+        return False
+    rebuild(db)
+    return True
+
+
+def rebuild(db: Session):
+    """Recompute every aggregate from the notes table.
+
+    Use after importing data behind the CRUD layer's back or to repair drift.
+    """
+    frequencies = Counter()
+    note_count = 0
+    total_word_count = 0
+    stale_counts = []
+
+    rows = db.execute(
+        select(Note.id, Note.content, Note.word_count).execution_options(yield_per=REBUILD_BATCH_SIZE)
+    )
+    for note_id, content, stored_count in rows:
+        words = tokenize(content)
+        frequencies.update(words)
+        note_count += 1
+        total_word_count += len(words)
+        if stored_count != len(words):
+            stale_counts.append({"b_id": note_id, "word_count": len(words)})
+
+    for start in range(0, len(stale_counts), REBUILD_BATCH_SIZE):
+        db.execute(SET_WORD_COUNT, stale_counts[start:start + REBUILD_BATCH_SIZE])
+
+    db.execute(delete(WordFrequency))
+    db.execute(delete(AnalyticsTotals))
+    items = [{"word": word, "count": count} for word, count in frequencies.items()]
+    for start in range(0, len(items), REBUILD_BATCH_SIZE):
+        db.execute(WordFrequency.__table__.insert(), items[start:start + REBUILD_BATCH_SIZE])
+    db.add(AnalyticsTotals(id=TOTALS_ID, note_count=note_count, total_word_count=total_word_count))
+    db.commit()
+
+    return {
+        "notes": note_count,
+        "words": total_word_count,
+        "vocabulary": len(frequencies),
+        "repaired_word_counts": len(stale_counts),
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m src.analytics rebuild")
+    from src.database import SessionLocal
+
+    with SessionLocal() as session:
+        print(rebuild(session))
@@ -0,0 +1,37 @@
+"""Async versions of the ``src.crud`` functions for ``AsyncSession``.
+
+Writes reuse the sync implementations through ``AsyncSession.run_sync``,
+so the version history, analytics, search index and summary invalidation
+stay in one place while all I/O goes through the async driver.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from src import crud, search
+from src.models import Note
+
+
+async def create_note(db: AsyncSession, title: str, content: str):
+    return await db.run_sync(crud.create_note, title, content)
+
+
+async def get_note(db: AsyncSession, note_id: int):
+    return await db.get(Note, note_id)
+
+
+async def update_note(db: AsyncSession, note_id: int, content: str, expected_revision: int = None):
+    return await db.run_sync(crud.update_note, note_id, content, expected_revision)
+
+
+async def delete_note(db: AsyncSession, note_id: int):
+    return await db.run_sync(crud.delete_note, note_id)
+
+
+async def bulk_apply(db: AsyncSession, operations: list):
+    return await db.run_sync(crud.bulk_apply, operations)
+
+
+async def list_notes(db: AsyncSession, after: tuple = None, limit: int = 50, fields: tuple = crud.NOTE_FIELDS):
+    return await db.run_sync(crud.list_notes, after, limit, fields)
+
+
+async def search_notes(db: AsyncSession, query: str, limit: int = 20, offset: int = 0):
+    return await db.run_sync(search.search_notes, query, limit, offset)
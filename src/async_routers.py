@@ -0,0 +1,69 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from src import async_crud, database, note_cache, schemas
+from src.routers import NotePageParams, cache_note, expected_revision, note_json, search_page, serialize_note
+
+async_crud_router = APIRouter()
+
+
+@async_crud_router.post("/notes/", response_model=schemas.Note)
+async def create_note(note: schemas.NoteCreate, db: AsyncSession = Depends(database.get_async_db)):
+    created = await async_crud.create_note(db, title=note.title, content=note.content)
+    return note_json(created.revision, serialize_note(created))
+
+
+@async_crud_router.post("/notes:bulk", response_model=schemas.BulkResponse)
+async def bulk_notes(request: schemas.BulkRequest, db: AsyncSession = Depends(database.get_async_db)):
+    results = await async_crud.bulk_apply(db, [operation.model_dump() for operation in request.operations])
+    return {"results": results}
+
+
+@async_crud_router.get("/notes/", response_model=schemas.NotePage)
+async def list_notes(params: NotePageParams = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    rows = await async_crud.list_notes(db, after=params.after, limit=params.limit, fields=params.fields)
+    return params.page(rows)
+
+
+@async_crud_router.get("/notes/search", response_model=schemas.NoteSearchResults)
+async def search_notes(
+    q: str = Query(..., min_length=1, description="Words that must all appear in the title or content."),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    hits = await async_crud.search_notes(db, q, limit=limit + 1, offset=offset)
+    return search_page(hits, limit, offset)
+
+
+@async_crud_router.get("/notes/{note_id}", response_model=schemas.Note)
+async def read_note(note_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    cached = note_cache.get(note_id)
+    if cached is None:
+        token = note_cache.generation(note_id)
+        note = await async_crud.get_note(db, note_id)
+        if not note:
+            raise HTTPException(status_code=404, detail="Note not found")
+        cached = cache_note(note, token)
+    return note_json(*cached)
+
+
+@async_crud_router.put("/notes/{note_id}", response_model=schemas.Note)
+async def update_note(
+    note_id: int,
+    note: schemas.NoteUpdate,
+    revision: Optional[int] = Depends(expected_revision),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    updated_note = await async_crud.update_note(db, note_id, content=note.content, expected_revision=revision)
+    if not updated_note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return note_json(updated_note.revision, serialize_note(updated_note))
+
+
+@async_crud_router.delete("/notes/{note_id}", response_model=dict)
+async def delete_note(note_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    note = await async_crud.delete_note(db, note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return {"message": "Note deleted"}
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU map with hit/miss/eviction counters.
+
+    With ``ttl`` (seconds) entries also expire; expired entries count as
+    misses and as ``expirations``.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= self.clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FakeSharedCache:
+    """In-process stand-in for a shared bytes cache such as Redis or
+    memcached: ``get``/``set(key, value, ttl)``/``delete`` on ``bytes``.
+
+    Several ``ReadThroughCache`` instances pointed at one ``FakeSharedCache``
+    behave like several app processes sharing one cache server.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= self.clock():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        with self._lock:
+            self._data[key] = (bytes(value), self.clock() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class ReadThroughCache:
+    """Two-level cache of serialized values: a local ``LRUCache`` in front
+    of an optional shared backend.
+
+    Local entries should use a short TTL: invalidations only reach the
+    local cache of the process that performed the write, other processes
+    rely on the shared backend and on expiry.
+    """
+
+    def __init__(self, local: LRUCache, shared=None, shared_ttl: float = None):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        value = self.shared.get(key)
+        if value is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.shared_ttl)
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared_hits = self.shared_misses = 0
+
+    def stats(self):
+        stats = self.local.stats()
+        lookups = stats["hits"] + stats["misses"]
+        served = stats["hits"] + self.shared_hits
+        stats.update(
+            shared_hits=self.shared_hits,
+            shared_misses=self.shared_misses,
+            hit_ratio=served / lookups if lookups else 0.0,
+        )
+        return stats
@@ -0,0 +1,69 @@
+import re
+import zlib
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+BOUNDARY_MODULUS = 4
+
+
+def _split_oversized(text: str, max_chars: int):
+    """Hard-split a single sentence that is longer than ``max_chars``,
+    preferring whitespace boundaries."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _is_boundary(unit: str):
+    return zlib.crc32(unit.encode("utf-8")) % BOUNDARY_MODULUS == 0
+
+
+def _units(text: str, max_chars: int):
+    """Yield ``(unit, separator, boundary_after)`` for each paragraph, or for
+    each sentence piece of a paragraph longer than ``max_chars``."""
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph, "\n\n", _is_boundary(paragraph)
+            continue
+        pieces = [piece for sentence in SENTENCE_END.split(paragraph) for piece in _split_oversized(sentence, max_chars)]
+        for index, piece in enumerate(pieces):
+            separator = "\n\n" if index == 0 else " "
+            yield piece, separator, index == len(pieces) - 1 or _is_boundary(piece)
+
+
+def split_text(text: str, max_chars: int, min_chars: int = None):
+    """Split ``text`` into chunks of at most ``max_chars`` characters.
+
+    Paragraphs are kept whole where possible, long paragraphs are split on
+    sentence boundaries and only overlong sentences are cut mid-text.
+    Once a chunk holds ``min_chars`` (default ``max_chars // 2``), it also
+    ends after any unit whose checksum is a multiple of
+    ``BOUNDARY_MODULUS``. Those content-defined boundaries keep an edit from
+    shifting every later chunk, so unchanged sections of an edited note
+    produce identical chunks; the floor keeps chunks near the budget, so a
+    note costs about ``len(text) / max_chars`` model calls.
+    """
+    min_chars = max_chars // 2 if min_chars is None else min_chars
+    chunks = []
+    current = ""
+    for unit, separator, boundary_after in _units(text, max_chars):
+        if current and len(current) + len(separator) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{unit}" if current else unit
+        if boundary_after and len(current) >= min_chars:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
@@ -1,6 +1,57 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
 class Settings:
     database_url: str = "sqlite:///./test.db"
     test_database_url: str = "sqlite:///:memory:"
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    metrics_n_plus_one_threshold: int = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+    db_async: bool = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+    db_profile: str = os.getenv("DB_PROFILE", "tuned")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    sqlite_cache_size: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    analytics_mode: str = os.getenv("ANALYTICS_MODE", "incremental")
+    analytics_scan_chunk_size: int = int(os.getenv("ANALYTICS_SCAN_CHUNK_SIZE", "1000"))
+    analytics_batch_size: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "1000"))
+    analytics_histogram_bins: int = int(os.getenv("ANALYTICS_HISTOGRAM_BINS", "10"))
+    note_cache_size: int = int(os.getenv("NOTE_CACHE_SIZE", "4096"))
+    note_cache_ttl: float = float(os.getenv("NOTE_CACHE_TTL", "30"))
+    note_cache_backend: str = os.getenv("NOTE_CACHE_BACKEND", "local")
+    note_cache_shared_ttl: float = float(os.getenv("NOTE_CACHE_SHARED_TTL", "300"))
+    version_snapshot_interval: int = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "16"))
+    version_keep_max: int = int(os.getenv("VERSION_KEEP_MAX", "0"))
+    version_keep_days: float = float(os.getenv("VERSION_KEEP_DAYS", "0"))
+    import_batch_size: int = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+    rollup_hourly_days: float = float(os.getenv("ROLLUP_HOURLY_DAYS", "30"))
+    rollup_top_words: int = int(os.getenv("ROLLUP_TOP_WORDS", "20"))
+    version_prune_batch_size: int = int(os.getenv("VERSION_PRUNE_BATCH_SIZE", "500"))
+    gemini_model_name: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+    summary_cache_size: int = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+    model_provider: str = os.getenv("MODEL_PROVIDER", "gemini")
+    model_init: str = os.getenv("MODEL_INIT", "lazy")
+    fake_model_latency: float = float(os.getenv("FAKE_MODEL_LATENCY", "0.5"))
+    model_concurrency: int = int(os.getenv("MODEL_CONCURRENCY", "8"))
+    model_timeout: float = float(os.getenv("MODEL_TIMEOUT", "30"))
+    model_max_retries: int = int(os.getenv("MODEL_MAX_RETRIES", "2"))
+    model_backoff_base: float = float(os.getenv("MODEL_BACKOFF_BASE", "0.5"))
+    model_rate_per_minute: float = float(os.getenv("MODEL_RATE_PER_MINUTE", "1000"))
+    model_rate_burst: float = float(os.getenv("MODEL_RATE_BURST", "50"))
+    model_rate_max_wait: float = float(os.getenv("MODEL_RATE_MAX_WAIT", "10"))
+    model_backoff_max: float = float(os.getenv("MODEL_BACKOFF_MAX", "8"))
+    summary_chunk_chars: int = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+    batch_workers: int = int(os.getenv("BATCH_WORKERS", "4"))
+    batch_max_notes: int = int(os.getenv("BATCH_MAX_NOTES", "1000"))
+    batch_pack_max_chars: int = int(os.getenv("BATCH_PACK_MAX_CHARS", "4000"))
+    batch_pack_max_notes: int = int(os.getenv("BATCH_PACK_MAX_NOTES", "10"))
+    job_retention: int = int(os.getenv("JOB_RETENTION", "1000"))
 
 
 settings = Settings()
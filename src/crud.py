@@ -1,11 +1,36 @@
+from sqlalchemy import bindparam, select, delete, insert, update, func, tuple_
 from sqlalchemy.orm import Session
-from src.models import Note, NoteVersion
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.exc import StaleDataError
+from src import analytics, note_cache, rollups, search, similarity, versions
+from src.database import dialect_insert
+from src.models import Note, NoteVersion, CachedSummary, ChunkSummary
 import datetime
 
+BULK_CHUNK_SIZE = 500
+UPDATE_RETRIES = 3
+
+
+class RevisionConflict(Exception):
+    """The note is not at the revision the caller expected: either an
+    explicit ``expected_revision`` did not match or a concurrent writer
+    committed first."""
+
+    def __init__(self, note_id: int = None, expected_revision: int = None):
+        super().__init__(
+            f"Note {note_id} was modified by another request" if note_id else "Notes were modified by another request"
+        )
+        self.note_id = note_id
+        self.expected_revision = expected_revision
+
 
 def create_note(db: Session, title: str, content: str):
     note = Note(title=title, content=content)
+    note.word_count = analytics.record_change(db, None, content, note_delta=1)
     db.add(note)
+    db.flush()
+    search.index_note(db, note.id, title, content)
+    similarity.index_note(db, note.id, content)
     db.commit()
     db.refresh(note)
     return note
@@ -14,25 +39,322 @@ def create_note(db: Session, title: str, content: str):
 def get_note(db: Session, note_id: int):
     return db.get(Note, note_id)
 
-def update_note(db: Session, note_id: int, content: str):
-    note = db.get(Note, note_id)
-    if note:
-        version = NoteVersion(note_id=note.id, content=note.content)
-        db.add(version)
-        note.content = content
-        note.updated_at = datetime.datetime.now(datetime.timezone.utc)
-        db.commit()
-        db.refresh(note)
+def update_note(db: Session, note_id: int, content: str, expected_revision: int = None):
+    """Replace the content of a note, or return ``None`` if it does not exist.
+
+    With ``expected_revision`` a note at any other revision raises
+    ``RevisionConflict``. Without it the last writer wins: a commit that
+    loses the race to a concurrent writer is retried on the fresh row up to
+    ``UPDATE_RETRIES`` times.
+    """
+    for attempt in range(UPDATE_RETRIES + 1):
+        note = db.get(Note, note_id)
+        if not note:
+            return None
+        try:
+            return _update_note(db, note, content, expected_revision)
+        except RevisionConflict:
+            if expected_revision is not None or attempt == UPDATE_RETRIES:
+                raise
+
+
+def _update_note(db: Session, note: Note, content: str, expected_revision: int = None):
+    revision = note.revision or 1
+    if expected_revision is not None and expected_revision != revision:
+        raise RevisionConflict(note.id, expected_revision)
+    db.add(NoteVersion(**versions.version_row(note.id, revision, note.content, content)))
+    note.revision = revision + 1
+    note.word_count = analytics.record_change(db, note.content, content)
+    if content != note.content:
+        _delete_summaries(db, note.id)
+        search.unindex_note(db, note.id, note.title, note.content)
+        search.index_note(db, note.id, note.title, content)
+        similarity.reindex_note(db, note.id, content)
+    note.content = content
+    note.updated_at = datetime.datetime.now(datetime.timezone.utc)
+    _commit(db, note.id, expected_revision)
+    note_cache.invalidate(note.id)
+    db.refresh(note)
     return note
 
 
 def delete_note(db: Session, note_id: int):
     note = db.get(Note, note_id)
     if note:
+        analytics.record_change(db, note.content, None, note_delta=-1)
+        _delete_summaries(db, note.id)
+        search.unindex_note(db, note.id, note.title, note.content)
+        similarity.unindex_notes(db, [note.id])
+        db.execute(update(NoteVersion).where(NoteVersion.note_id == note.id).values(note_id=None))
         db.delete(note)
-        db.commit()
+        _commit(db, note.id)
+        note_cache.invalidate(note.id)
     return note
 
 
+def _commit(db: Session, note_id: int, expected_revision: int = None):
+    try:
+        db.commit()
+    except StaleDataError as e:
+        db.rollback()
+        raise RevisionConflict(note_id, expected_revision) from e
+
+
+NOTES = Note.__table__
+CONDITIONAL_UPDATE = update(NOTES).where(NOTES.c.id == bindparam("b_id"), NOTES.c.revision == bindparam("b_revision"))
+CONDITIONAL_DELETE = delete(NOTES).where(NOTES.c.id == bindparam("b_id"), NOTES.c.revision == bindparam("b_revision"))
+
+
+def _execute_conditional(db: Session, statement, rows: list):
+    """executemany ``statement`` and fail the whole batch if any note moved
+    past the revision read at the start of the transaction."""
+    if rows and db.execute(statement, rows).rowcount != len(rows):
+        db.rollback()
+        raise RevisionConflict()
+
+
+def bulk_apply(db: Session, operations: list):
+    """Apply create/update/delete operations in one transaction.
+
+    ``operations`` are dicts with an ``op`` key (``create``: title, content;
+    ``update``: id, content; ``delete``: id), applied in order. Rows, version
+    history, analytics, search and similarity indexes and summary
+    invalidation are all written with one executemany statement per kind.
+    Returns one ``{"index", "op", "id", "status"}`` result per operation.
+
+    Note updates and deletes only apply at the revision read at the start;
+    if another writer committed in between, the whole batch is rolled back
+    and ``RevisionConflict`` raised.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    target_ids = {op["id"] for op in operations if op["op"] != "create"}
+    original = {}
+    revisions = {}
+    for start in range(0, len(target_ids), BULK_CHUNK_SIZE):
+        chunk = list(target_ids)[start:start + BULK_CHUNK_SIZE]
+        for note_id, title, content, revision in db.execute(
+            select(Note.id, Note.title, Note.content, Note.revision).where(Note.id.in_(chunk))
+        ):
+            original[note_id] = (title, content)
+            revisions[note_id] = revision
+
+    current = {note_id: content for note_id, (_, content) in original.items()}
+    loaded_revisions = dict(revisions)
+    revised = set()
+    results = []
+    created = []
+    history = []
+    deleted = []
+    for index, op in enumerate(operations):
+        if op["op"] == "create":
+            created.append({"title": op["title"], "content": op["content"], "created_at": now, "updated_at": now})
+            results.append({"index": index, "op": "create", "id": None, "status": "created"})
+            continue
+        note_id = op["id"]
+        if note_id not in current:
+            results.append({"index": index, "op": op["op"], "id": note_id, "status": "not_found"})
+            continue
+        if op["op"] == "update":
+            history.append(
+                dict(versions.version_row(note_id, revisions[note_id], current[note_id], op["content"]), created_at=now)
+            )
+            revisions[note_id] += 1
+            revised.add(note_id)
+            current[note_id] = op["content"]
+            results.append({"index": index, "op": "update", "id": note_id, "status": "updated"})
+        else:
+            del current[note_id]
+            deleted.append(note_id)
+            results.append({"index": index, "op": "delete", "id": note_id, "status": "deleted"})
+
+    changed = [note_id for note_id, content in current.items() if content != original[note_id][1]]
+    word_counts = analytics.record_changes(
+        db,
+        [(None, row["content"]) for row in created]
+        + [(original[note_id][1], current[note_id]) for note_id in changed]
+        + [(original[note_id][1], None) for note_id in deleted],
+        note_delta=len(created) - len(deleted),
+    )
+    # Updates that leave the content as it was still count as edits, as in
+    # update_note.
+    unchanged = revised.intersection(current).difference(changed)
+    rollups.record(db, now, edited=len(unchanged))
+    for row, word_count in zip(created, word_counts):
+        row["word_count"] = word_count
+
+    if created:
+        new_ids = db.execute(
+            insert(Note).returning(Note.id, sort_by_parameter_order=True), created
+        ).scalars().all()
+        for row, note_id in zip(created, new_ids):
+            row["id"] = note_id
+        create_results = (result for result in results if result["op"] == "create")
+        for result, note_id in zip(create_results, new_ids):
+            result["id"] = note_id
+        search.index_notes(db, [{"id": row["id"], "title": row["title"], "content": row["content"]} for row in created])
+        similarity.index_notes(db, created)
+    if history:
+        db.execute(insert(NoteVersion), history)
+    if changed:
+        _execute_conditional(
+            db,
+            CONDITIONAL_UPDATE,
+            [
+                {
+                    "b_id": note_id,
+                    "b_revision": loaded_revisions[note_id],
+                    "content": current[note_id],
+                    "word_count": word_count,
+                    "revision": revisions[note_id],
+                    "updated_at": now,
+                }
+                for note_id, word_count in zip(changed, word_counts[len(created):])
+            ],
+        )
+    _execute_conditional(
+        db,
+        CONDITIONAL_UPDATE,
+        [
+            {"b_id": note_id, "b_revision": loaded_revisions[note_id], "revision": revisions[note_id], "updated_at": now}
+            for note_id in unchanged
+        ],
+    )
+    touched = changed + deleted
+    if touched:
+        search.unindex_notes(
+            db, [{"id": note_id, "title": original[note_id][0], "content": original[note_id][1]} for note_id in touched]
+        )
+        search.index_notes(
+            db, [{"id": note_id, "title": original[note_id][0], "content": current[note_id]} for note_id in changed]
+        )
+        similarity.unindex_notes(db, touched)
+        similarity.index_notes(db, [{"id": note_id, "content": current[note_id]} for note_id in changed])
+        db.execute(delete(CachedSummary).where(CachedSummary.note_id.in_(touched)))
+    if deleted:
+        db.execute(update(NoteVersion).where(NoteVersion.note_id.in_(deleted)).values(note_id=None))
+        _execute_conditional(
+            db, CONDITIONAL_DELETE, [{"b_id": note_id, "b_revision": loaded_revisions[note_id]} for note_id in deleted]
+        )
+        # Core statements bypass the session; drop loaded copies of the rows.
+        for note_id in deleted:
+            note = db.identity_map.get(identity_key(Note, note_id))
+            if note is not None:
+                db.expunge(note)
+    db.commit()
+    note_cache.invalidate(*touched, *unchanged)
+    return results
+
+
+NOTE_FIELDS = ("id", "title", "content", "word_count", "revision", "created_at", "updated_at")
+
+
+def list_notes(db: Session, after: tuple = None, limit: int = 50, fields: tuple = NOTE_FIELDS):
+    """One page of notes in ``(updated_at, id)`` order, starting after the
+    ``(updated_at, id)`` keyset ``after``; served by ix_notes_updated_at_id."""
+    query = select(*(getattr(Note, field) for field in fields))
+    if after is not None:
+        query = query.where(tuple_(Note.updated_at, Note.id) > tuple_(*after))
+    query = query.order_by(Note.updated_at, Note.id).limit(limit)
+    return db.execute(query).mappings().all()
+
+
+def list_versions(
+    db: Session,
+    note_id: int,
+    before: tuple = None,
+    limit: int = 50,
+    since: datetime.datetime = None,
+    until: datetime.datetime = None,
+    with_data: bool = False,
+):
+    """One page of a note's versions, newest first by ``(created_at, id)``,
+    starting before the keyset ``before``; served by
+    ix_note_versions_note_id_created_at. Stored data is only read when
+    ``with_data`` is set."""
+    columns = [
+        NoteVersion.id,
+        NoteVersion.revision,
+        NoteVersion.created_at,
+        NoteVersion.is_snapshot,
+        func.coalesce(func.length(NoteVersion.delta), func.length(NoteVersion.content)).label("size"),
+    ]
+    if with_data:
+        columns += [NoteVersion.delta, NoteVersion.content]
+    query = select(*columns).where(NoteVersion.note_id == note_id)
+    if since is not None:
+        query = query.where(NoteVersion.created_at >= since)
+    if until is not None:
+        query = query.where(NoteVersion.created_at < until)
+    if before is not None:
+        query = query.where(tuple_(NoteVersion.created_at, NoteVersion.id) < tuple_(*before))
+    query = query.order_by(NoteVersion.created_at.desc(), NoteVersion.id.desc()).limit(limit)
+    return db.execute(query).all()
+
+
 def get_all_notes(db: Session):
     return db.query(Note).all()
+
+
+def iter_note_contents(db: Session, chunk_size: int = 1000):
+    """Stream ``(id, content)`` rows using a server-side cursor."""
+    return db.execute(
+        select(Note.id, Note.content).execution_options(yield_per=chunk_size)
+    )
+
+
+def get_note_contents(db: Session, note_ids: list):
+    return db.execute(select(Note.id, Note.content).where(Note.id.in_(note_ids))).all()
+
+
+def find_note_ids(db: Session, title_contains: str = None, limit: int = 1000):
+    query = select(Note.id).order_by(Note.id).limit(limit)
+    if title_contains:
+        query = query.where(Note.title.contains(title_contains, autoescape=True))
+    return db.execute(query).scalars().all()
+
+
+def get_cached_summary(db: Session, note_id: int, content_hash: str, model_name: str):
+    return db.execute(
+        select(CachedSummary.summary).where(
+            CachedSummary.note_id == note_id,
+            CachedSummary.content_hash == content_hash,
+            CachedSummary.model_name == model_name,
+        )
+    ).scalar_one_or_none()
+
+
+def save_summary(db: Session, note_id: int, content_hash: str, model_name: str, summary: str):
+    insert = dialect_insert(db)
+    db.execute(
+        insert(CachedSummary)
+        .values(note_id=note_id, content_hash=content_hash, model_name=model_name, summary=summary)
+        .on_conflict_do_nothing(index_elements=["note_id", "content_hash", "model_name"])
+    )
+    db.commit()
+
+
+def get_chunk_summaries(db: Session, chunk_hashes: list, model_name: str):
+    rows = db.execute(
+        select(ChunkSummary.chunk_hash, ChunkSummary.summary).where(
+            ChunkSummary.chunk_hash.in_(chunk_hashes), ChunkSummary.model_name == model_name
+        )
+    )
+    return dict(rows.all())
+
+
+def save_chunk_summaries(db: Session, summaries: dict, model_name: str):
+    if not summaries:
+        return
+    insert = dialect_insert(db)
+    db.execute(
+        insert(ChunkSummary).on_conflict_do_nothing(index_elements=["chunk_hash", "model_name"]),
+        [
+            {"chunk_hash": chunk_hash, "model_name": model_name, "summary": summary}
+            for chunk_hash, summary in summaries.items()
+        ],
+    )
+    db.commit()
+
+
+def _delete_summaries(db: Session, note_id: int):
+    db.execute(delete(CachedSummary).where(CachedSummary.note_id == note_id))
@@ -1,14 +1,146 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from src.config import settings
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///notes.db")
-engine = create_engine(DATABASE_URL)
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, profile: str = None):
+    """Engine for ``url`` configured by the ``DB_PROFILE`` setting.
+
+    ``tuned`` applies WAL and the SQLite pragmas from settings on every new
+    connection and sizes the pool from settings; ``default`` keeps
+    SQLAlchemy's defaults.
+    """
+    profile = profile or settings.db_profile
+    url = make_url(url)
+    if profile == "default":
+        return create_engine(url)
+
+    sqlite = url.get_backend_name() == "sqlite"
+    memory = sqlite and url.database in (None, "", ":memory:")
+    options = {}
+    if memory:
+        options.update(poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        options.update(
+            poolclass=QueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+        if sqlite:
+            options["connect_args"] = {"check_same_thread": False}
+        else:
+            options["pool_pre_ping"] = True
+    engine = create_engine(url, **options)
+    if sqlite and not memory:
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+_async_sessionmaker = None
+
+
+def async_database_url(url: str = DATABASE_URL):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def create_async_db_engine(url: str = DATABASE_URL, profile: str = None):
+    """Async counterpart of ``create_db_engine`` (aiosqlite/asyncpg), with
+    the same pool sizing and SQLite pragmas."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    profile = profile or settings.db_profile
+    url = async_database_url(url)
+    if profile == "default":
+        return create_async_engine(url)
+
+    sqlite = url.get_backend_name() == "sqlite"
+    if sqlite and url.database in (None, "", ":memory:"):
+        return create_async_engine(url, poolclass=StaticPool)
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if not sqlite:
+        options["pool_pre_ping"] = True
+    engine = create_async_engine(url, **options)
+    if sqlite:
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+def get_async_sessionmaker():
+    """Created on first use so the sync-only deployment never imports the
+    async drivers."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmaker = async_sessionmaker(
+            create_async_db_engine(DATABASE_URL), autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+def dialect_insert(db: Session):
+    """``insert()`` construct with ON CONFLICT support for the session's backend."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def sync_id_sequence(db: Session, table):
+    """Move the PostgreSQL serial sequence of ``table.id`` to its largest id
+    after rows were inserted with explicit ids. SQLite needs nothing: new
+    rowids always follow the largest one."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        select(func.setval(func.pg_get_serial_sequence(table.name, "id"), select(func.max(table.c.id)).scalar_subquery()))
+    )
+
+
+def get_session_factory():
+    """Dependency for async routes that open short-lived sessions themselves."""
+    return SessionLocal
+
+
 def get_db():
     db = SessionLocal()
     try:
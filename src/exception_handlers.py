@@ -1,8 +1,14 @@
+import logging
+import math
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from starlette import status
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from sqlalchemy.exc import SQLAlchemyError
+from src.crud import RevisionConflict
+from src.llm import ModelCallError, ModelUnavailable, RateLimited
+
+logger = logging.getLogger(__name__)
 
 def setup_exception_handlers(app: FastAPI):
 
@@ -13,8 +19,44 @@ def setup_exception_handlers(app: FastAPI):
             content={"detail": exc.detail},
         )
 
+    @app.exception_handler(RevisionConflict)
+    async def revision_conflict_handler(request: Request, exc: RevisionConflict):
+        # A failed If-Match precondition is 412; a concurrent write that
+        # the client did not guard against is 409 and safe to retry.
+        return JSONResponse(
+            status_code=(
+                status.HTTP_412_PRECONDITION_FAILED
+                if exc.expected_revision is not None
+                else status.HTTP_409_CONFLICT
+            ),
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(ModelUnavailable)
+    async def model_unavailable_handler(request: Request, exc: ModelUnavailable):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": str(exc)},
+        )
+
+    @app.exception_handler(RateLimited)
+    async def rate_limited_handler(request: Request, exc: RateLimited):
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": str(exc)},
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        )
+
+    @app.exception_handler(ModelCallError)
+    async def model_call_error_handler(request: Request, exc: ModelCallError):
+        return JSONResponse(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            content={"detail": "Model call failed"},
+        )
+
     @app.exception_handler(SQLAlchemyError)
     async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
+        logger.error("Database error on %s %s", request.method, request.url.path, exc_info=exc)
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"detail": "Database error occurred"},
@@ -22,6 +64,7 @@ def setup_exception_handlers(app: FastAPI):
 
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
+        logger.error("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"detail": "An unexpected error occurred"},
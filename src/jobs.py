@@ -0,0 +1,163 @@
+import asyncio
+import datetime
+import math
+import re
+import uuid
+from src import crud, llm, services
+from src.cache import LRUCache
+from src.config import settings
+
+PACKED_LINE = re.compile(r"^\[(\d+)\]\s*(.+)$", re.MULTILINE)
+
+
+class SummaryJob:
+    def __init__(self, note_ids: list):
+        self.id = uuid.uuid4().hex
+        self.note_ids = note_ids
+        self.status = "pending"
+        self.results = {}
+        self.errors = {}
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.note_ids),
+            "completed": len(self.results),
+            "failed": len(self.errors),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "results": [
+                {"id": note_id, "summary": self.results.get(note_id), "error": self.errors.get(note_id)}
+                for note_id in self.note_ids
+                if note_id in self.results or note_id in self.errors
+            ],
+        }
+
+
+jobs = LRUCache(settings.job_retention)
+
+
+def create_job(note_ids: list):
+    job = SummaryJob(list(dict.fromkeys(note_ids)))
+    jobs.set(job.id, job)
+    return job
+
+
+def get_job(job_id: str):
+    return jobs.get(job_id)
+
+
+def packed_prompt(notes: list):
+    lines = "\n".join(f"[{note_id}] {' '.join(content.split())}" for note_id, content, _ in notes)
+    return (
+        "Summarize each of the following notes separately. Answer with exactly one line per note "
+        f'in the form "[<id>] <summary>".\n\n{lines}'
+    )
+
+
+def pack_notes(pending: list):
+    """Group short notes into shared prompts; long notes get a prompt of their own."""
+    groups = []
+    current = []
+    size = 0
+    for item in pending:
+        length = len(item[1])
+        if length > settings.batch_pack_max_chars // 2:
+            groups.append([item])
+            continue
+        if current and (size + length > settings.batch_pack_max_chars or len(current) == settings.batch_pack_max_notes):
+            groups.append(current)
+            current = []
+            size = 0
+        current.append(item)
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _prepare(session_factory, note_ids: list):
+    found = {}
+    with session_factory() as db:
+        for note_id, content in crud.get_note_contents(db, note_ids):
+            key = services.summary_key(note_id, content)
+            found[note_id] = (note_id, content, key, services.lookup_summary(db, key))
+    return found
+
+
+def _store(session_factory, items: list):
+    with session_factory() as db:
+        for key, summary in items:
+            services.store_summary(db, key, summary)
+
+
+async def _summarize_one(model, item: tuple, session_factory):
+    note_id, content, key = item
+    # Background jobs queue behind the rate limit instead of failing.
+    return {note_id: (key, await services.summarize_content(model, content, session_factory, max_wait=math.inf))}
+
+
+async def _summarize_group(model, group: list, session_factory):
+    if len(group) == 1:
+        return await _summarize_one(model, group[0], session_factory)
+    text = await llm.generate(model, packed_prompt(group), max_wait=math.inf)
+    answered = {int(note_id): summary.strip() for note_id, summary in PACKED_LINE.findall(text)}
+    results = {}
+    for item in group:
+        summary = answered.get(item[0])
+        if summary:
+            results[item[0]] = (item[2], summary)
+        else:
+            results.update(await _summarize_one(model, item, session_factory))
+    return results
+
+
+async def run_job(job: SummaryJob, session_factory):
+    """Summarize every note of ``job`` with a pool of ``BATCH_WORKERS``
+    workers, reusing cached summaries and packing short notes together."""
+    job.status = "running"
+    try:
+        await _run(job, session_factory)
+    except Exception:
+        job.status = "failed"
+        raise
+    finally:
+        job.finished_at = datetime.datetime.now(datetime.timezone.utc)
+
+
+async def _run(job: SummaryJob, session_factory):
+    found = await asyncio.to_thread(_prepare, session_factory, job.note_ids)
+    pending = []
+    for note_id in job.note_ids:
+        if note_id not in found:
+            job.errors[note_id] = "Note not found"
+            continue
+        _, content, key, summary = found[note_id]
+        if summary is not None:
+            job.results[note_id] = summary
+        else:
+            pending.append((note_id, content, key))
+
+    queue = asyncio.Queue()
+    for group in pack_notes(pending):
+        queue.put_nowait(group)
+    model = await services.get_model_async()
+
+    async def worker():
+        while not queue.empty():
+            group = queue.get_nowait()
+            try:
+                results = await _summarize_group(model, group, session_factory)
+            except llm.ModelCallError as e:
+                for note_id, _, _ in group:
+                    job.errors[note_id] = str(e)
+                continue
+            await asyncio.to_thread(_store, session_factory, list(results.values()))
+            for note_id, (_, summary) in results.items():
+                job.results[note_id] = summary
+
+    await asyncio.gather(*(worker() for _ in range(settings.batch_workers)))
+    job.status = "failed" if job.errors and not job.results else "completed"
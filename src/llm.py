@@ -0,0 +1,222 @@
+import asyncio
+import importlib
+import math
+import random
+import re
+import threading
+import time
+import weakref
+from src import metrics
+from src.config import settings
+
+
+class ModelCallError(Exception):
+    """The model call failed after all retries."""
+
+
+class ModelUnavailable(Exception):
+    """No model provider is configured (``MODEL_PROVIDER=none``)."""
+
+
+class RateLimited(Exception):
+    """The model quota is exhausted for longer than the caller can wait."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Model rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute
+    access, so heavy client SDKs stay out of the import graph of
+    processes that never call them."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+PACKED_NOTE = re.compile(r"^\[(\d+)\] (.*)$", re.MULTILINE)
+
+
+def _tail(text: str, words: int = 20):
+    return " ".join(text.split()[-words:])
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Offline stand-in for ``genai.GenerativeModel``.
+
+    Sleeps ``latency`` seconds per call and fails the first ``failures``
+    calls, which makes timeouts, retries and concurrency limits testable.
+    Replies with the tail of the prompt, or one ``[id] ...`` line per note
+    for packed batch prompts.
+    """
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _reply(self, prompt: str):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("fake model failure")
+        packed = PACKED_NOTE.findall(prompt)
+        if packed:
+            return FakeResponse("\n".join(f"[{note_id}] {_tail(text)}" for note_id, text in packed))
+        return FakeResponse(_tail(prompt))
+
+    def generate_content(self, prompt: str):
+        time.sleep(self.latency)
+        return self._reply(prompt)
+
+    async def generate_content_async(self, prompt: str):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return self._reply(prompt)
+        finally:
+            self.in_flight -= 1
+
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _semaphore():
+    # One semaphore per event loop: asyncio primitives must not be shared
+    # across loops (tests and benchmarks spin up several).
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.model_concurrency)
+    return semaphore
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``burst``.
+
+    ``reserve`` takes a token right away and returns how long the caller
+    has to wait before spending it. The balance may go negative, which
+    queues callers in arrival order; a reservation that would wait longer
+    than ``max_wait`` is refused with ``RateLimited``. A ``rate`` of 0
+    disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = math.inf):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                self.rejected += 1
+                raise RateLimited(wait)
+            self.tokens -= 1
+            return wait
+
+
+rate_limiter = TokenBucket(settings.model_rate_per_minute / 60, settings.model_rate_burst)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call.
+
+    Callers that arrive while a call for their key is running await its
+    result instead of starting their own. A caller being cancelled does
+    not cancel the shared call.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        future = calls.get(key)
+        if future is None:
+            future = calls[key] = asyncio.ensure_future(fn())
+            future.add_done_callback(lambda done: self._finish(calls, key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    @staticmethod
+    def _finish(calls: dict, key, future):
+        calls.pop(key, None)
+        if not future.cancelled():
+            # Mark the exception retrieved even if every caller went away.
+            future.exception()
+
+
+def backoff_delay(attempt: int):
+    """Full-jitter exponential backoff."""
+    ceiling = min(settings.model_backoff_max, settings.model_backoff_base * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+async def _call(model, prompt: str):
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt)
+    return await asyncio.to_thread(model.generate_content, prompt)
+
+
+async def generate(model, prompt: str, timeout: float = None, retries: int = None, max_wait: float = None):
+    """Run one model call under the rate limit and the global concurrency
+    limit, with a per-attempt timeout and jittered retries. Returns the
+    stripped text.
+
+    Every attempt takes a token from ``rate_limiter``; if none frees up
+    within ``max_wait`` seconds (default ``MODEL_RATE_MAX_WAIT``)
+    ``RateLimited`` is raised."""
+    timeout = settings.model_timeout if timeout is None else timeout
+    retries = settings.model_max_retries if retries is None else retries
+    max_wait = settings.model_rate_max_wait if max_wait is None else max_wait
+    for attempt in range(retries + 1):
+        wait = rate_limiter.reserve(max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            async with _semaphore():
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(_call(model, prompt), timeout)
+                except asyncio.TimeoutError:
+                    metrics.record_model_call(time.perf_counter() - start, "timeout")
+                    raise
+                except Exception:
+                    metrics.record_model_call(time.perf_counter() - start, "error")
+                    raise
+                metrics.record_model_call(time.perf_counter() - start, "ok")
+            return response.text.strip()
+        except Exception as e:
+            if attempt == retries:
+                raise ModelCallError(str(e) or type(e).__name__) from e
+        await asyncio.sleep(backoff_delay(attempt))
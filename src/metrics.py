@@ -0,0 +1,259 @@
+"""Request, database and model-call instrumentation in Prometheus text format.
+
+``install(app)`` adds an ASGI middleware timing every request by route
+template, SQLAlchemy cursor hooks counting queries per request and the
+``/metrics`` endpoint. With ``METRICS_ENABLED=false`` nothing is installed
+and ``record_model_call`` returns immediately.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter as _Tally
+from fastapi import APIRouter, FastAPI, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: tuple, values: tuple, extra: str = ""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def get(self, *values):
+        return self._values.get(values, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labels, values), value) for values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *values, amount: float = 1):
+        self.inc(*values, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *values):
+        *labels, value = values
+        key = tuple(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, *values):
+        series = self._values.get(values)
+        return sum(series[0]) if series else 0
+
+    def total(self, *values):
+        series = self._values.get(values)
+        return series[1] if series else 0.0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    samples.append((f"{self.name}_bucket", _labels(self.labels, key, f'le="{le}"'), cumulative))
+                samples.append((f"{self.name}_sum", _labels(self.labels, key), total))
+                samples.append((f"{self.name}_count", _labels(self.labels, key), cumulative))
+        return samples
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route")
+)
+REQUESTS = Counter("http_requests_total", "Requests by route template and status.", ("method", "route", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served.")
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("route",), QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram("db_time_per_request_seconds", "Time spent in SQL per request.", ("route",))
+QUERY_DURATION = Histogram("db_query_duration_seconds", "Duration of individual SQL statements.")
+N_PLUS_ONE = Counter(
+    "db_n_plus_one_total", "Requests that repeated one SELECT at least METRICS_N_PLUS_ONE_THRESHOLD times.", ("route",)
+)
+MODEL_CALL_DURATION = Histogram("model_call_duration_seconds", "Model call attempts by outcome.", ("outcome",))
+
+METRICS = [
+    REQUEST_DURATION, REQUESTS, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME, QUERY_DURATION, N_PLUS_ONE,
+    MODEL_CALL_DURATION,
+]
+
+
+def _component_samples():
+    from src import llm, note_cache, services
+
+    notes = note_cache.stats()
+    summaries = services.summary_cache_stats()
+    return [
+        ("gauge", "note_cache_hit_ratio", notes["hit_ratio"]),
+        ("counter", "note_cache_evictions_total", notes["evictions"]),
+        ("gauge", "note_cache_size", notes["size"]),
+        ("counter", "summary_cache_memory_hits_total", summaries["memory_hits"]),
+        ("counter", "summary_cache_store_hits_total", summaries["store_hits"]),
+        ("counter", "summary_cache_misses_total", summaries["misses"]),
+        ("counter", "summary_coalesced_total", summaries["coalesced"]),
+        ("counter", "model_rate_limited_total", llm.rate_limiter.rejected),
+    ]
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    for kind, name, value in _component_samples():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "statements", "finished")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = _Tally()
+        self.finished = False
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"]
+    QUERY_DURATION.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None and not stats.finished:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if statement.lstrip()[:6].upper() == "SELECT":
+            stats.statements[statement] += 1
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering).
+
+    A request is measured until its last body message is sent, so
+    background tasks that run after the response (batch summary jobs) do
+    not count towards its latency, queries or in-flight time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        def finish():
+            if stats.finished:
+                return
+            stats.finished = True
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_DURATION.observe(scope["method"], path, elapsed)
+            REQUESTS.inc(scope["method"], path, str(status))
+            REQUEST_QUERIES.observe(path, stats.queries)
+            REQUEST_DB_TIME.observe(path, stats.db_time)
+            if stats.statements:
+                statement, repeats = stats.statements.most_common(1)[0]
+                if repeats >= settings.metrics_n_plus_one_threshold:
+                    N_PLUS_ONE.inc(path)
+                    logger.warning(
+                        "Possible N+1 on %s %s: SELECT ran %d times: %s", scope["method"], path, repeats, statement[:200]
+                    )
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            finish()
+            current_request.reset(token)
+
+
+def record_model_call(seconds: float, outcome: str):
+    if settings.metrics_enabled:
+        MODEL_CALL_DURATION.observe(outcome, seconds)
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+
+def install(app: FastAPI):
+    if not settings.metrics_enabled:
+        return
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_router)
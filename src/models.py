@@ -1,24 +1,161 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Text, DateTime, Boolean, LargeBinary, ForeignKey, Index, UniqueConstraint,
+    DDL, event,
+)
 from sqlalchemy.orm import relationship, declarative_base
 import datetime
 
 Base = declarative_base()
 
 
+def utcnow():
+    # Passed as a callable so every row gets its own insert time.
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
 class Note(Base):
     __tablename__ = "notes"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
-    updated_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
-    versions = relationship("NoteVersion", back_populates="note")
+    word_count = Column(Integer, nullable=False, default=0)
+    revision = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow)
+    # Version rows are detached explicitly on delete (crud.delete_note), so
+    # deleting a note never loads its history.
+    versions = relationship("NoteVersion", back_populates="note", passive_deletes="all")
+
+    __table_args__ = (
+        Index("ix_notes_word_count_id", "word_count", "id"),
+        Index("ix_notes_updated_at_id", "updated_at", "id"),
+    )
+    # Every ORM UPDATE/DELETE of a note is conditional on the revision it
+    # was loaded with; the CRUD layer sets the new revision itself.
+    __mapper_args__ = {"version_id_col": revision, "version_id_generator": False}
+
+
+# Full-text index over notes.title/content (SQLite FTS5, external content).
+# Kept in sync by src/search.py from the CRUD layer.
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts "
+        "USING fts5(title, content, content='notes', content_rowid='id')"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    Base.metadata,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"),
+)
 
 
 class NoteVersion(Base):
     __tablename__ = "note_versions"
     id = Column(Integer, primary_key=True, index=True)
     note_id = Column(Integer, ForeignKey("notes.id"))
+    # Revision of the note whose content this row stores. New rows keep that
+    # content in ``delta`` (see src/versions.py); ``content`` is only set on
+    # rows written before delta storage and not yet migrated.
+    revision = Column(Integer)
     content = Column(Text)
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    delta = Column(LargeBinary)
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=utcnow)
     note = relationship("Note", back_populates="versions")
+
+    __table_args__ = (
+        Index("ix_note_versions_note_id_revision", "note_id", "revision"),
+        Index("ix_note_versions_note_id_created_at", "note_id", "created_at"),
+    )
+
+
+class NoteSignature(Base):
+    # MinHash signature of the note content (src/similarity.py); NULL for
+    # notes without words, which are never near-duplicates.
+    __tablename__ = "note_signatures"
+    note_id = Column(Integer, ForeignKey("notes.id"), primary_key=True)
+    signature = Column(LargeBinary)
+
+
+class NoteBucket(Base):
+    # One LSH bucket per signature band; notes sharing a bucket are
+    # near-duplicate candidates.
+    __tablename__ = "note_lsh_buckets"
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id"), primary_key=True)
+
+    __table_args__ = (Index("ix_note_lsh_buckets_note_id", "note_id"),)
+
+
+class ImportCheckpoint(Base):
+    """Progress of an NDJSON import (src/transfer.py), advanced in the same
+    transaction as each committed batch."""
+    __tablename__ = "import_checkpoints"
+    import_id = Column(String, primary_key=True)
+    lines = Column(Integer, nullable=False, default=0)
+    notes = Column(Integer, nullable=False, default=0)
+    versions = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=utcnow)
+
+
+class AnalyticsRollup(Base):
+    # Per-hour and per-day activity counters (src/rollups.py); bucket_start
+    # is naive UTC.
+    __tablename__ = "analytics_rollups"
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    notes_created = Column(Integer, nullable=False, default=0)
+    notes_edited = Column(Integer, nullable=False, default=0)
+    notes_deleted = Column(Integer, nullable=False, default=0)
+    words_added = Column(Integer, nullable=False, default=0)
+    words_removed = Column(Integer, nullable=False, default=0)
+
+
+class RollupWord(Base):
+    # Words added per rollup bucket; closed buckets are trimmed to their
+    # top words by the compaction job.
+    __tablename__ = "analytics_rollup_words"
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    word = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class WordFrequency(Base):
+    __tablename__ = "word_frequencies"
+    word = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, index=True)
+
+
+class AnalyticsTotals(Base):
+    __tablename__ = "analytics_totals"
+    id = Column(Integer, primary_key=True)
+    note_count = Column(Integer, nullable=False, default=0)
+    total_word_count = Column(Integer, nullable=False, default=0)
+
+
+class CachedSummary(Base):
+    __tablename__ = "note_summaries"
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id"), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    model_name = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+    __table_args__ = (UniqueConstraint("note_id", "content_hash", "model_name"),)
+
+
+class ChunkSummary(Base):
+    __tablename__ = "chunk_summaries"
+    id = Column(Integer, primary_key=True)
+    chunk_hash = Column(String(64), nullable=False)
+    model_name = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+    __table_args__ = (UniqueConstraint("chunk_hash", "model_name"),)
@@ -0,0 +1,82 @@
+"""Read-through cache of serialized notes for ``GET /notes/{note_id}``.
+
+Entries are the exact JSON response bodies, so a hit skips the database
+and pydantic entirely. The CRUD layer invalidates entries after every
+committed update or delete. ``NOTE_CACHE_BACKEND=fake`` adds an in-process
+shared tier standing in for a cache server; any object with the
+``FakeSharedCache`` interface can be plugged in with ``configure``.
+
+Readers take a ``generation`` token before loading a note and pass it to
+``put``; every invalidation moves the note to a new generation, so a load
+that raced a write cannot re-cache the revision the write replaced.
+"""
+import itertools
+import threading
+from src.cache import FakeSharedCache, LRUCache, ReadThroughCache
+from src.config import settings
+
+_generations = LRUCache(settings.note_cache_size)
+_next_generation = itertools.count(1)
+_lock = threading.Lock()
+
+
+def _shared_backend(name: str):
+    if name == "local":
+        return None
+    if name == "fake":
+        return FakeSharedCache()
+    raise ValueError(f"Unknown note cache backend: {name!r}")
+
+
+def configure(shared=None, maxsize: int = None, ttl: float = None):
+    global note_cache
+    note_cache = ReadThroughCache(
+        LRUCache(settings.note_cache_size if maxsize is None else maxsize, ttl=ttl or settings.note_cache_ttl),
+        shared,
+        settings.note_cache_shared_ttl,
+    )
+    return note_cache
+
+
+note_cache = configure(_shared_backend(settings.note_cache_backend))
+
+
+def note_key(note_id: int):
+    return f"note:{note_id}"
+
+
+def get(note_id: int):
+    """``(revision, body)`` of a cached note, or ``None``."""
+    value = note_cache.get(note_key(note_id))
+    if value is None:
+        return None
+    revision, body = value.split(b"\n", 1)
+    return int(revision), body
+
+
+def generation(note_id: int):
+    """Token to take before loading ``note_id`` for ``put``."""
+    return _generations.get(note_id, 0)
+
+
+def put(note_id: int, revision: int, body: bytes, token: int):
+    """Cache a note loaded after ``generation`` returned ``token``; skipped,
+    returning ``False``, if the note was invalidated in between. A token
+    whose generation was evicted also fails, which only costs a fill."""
+    with _lock:
+        if _generations.get(note_id, 0) != token:
+            return False
+        # The revision rides along in the value so hits can send an ETag.
+        note_cache.set(note_key(note_id), b"%d\n%s" % (revision, body))
+        return True
+
+
+def invalidate(*note_ids: int):
+    with _lock:
+        for note_id in note_ids:
+            _generations.set(note_id, next(_next_generation))
+            note_cache.delete(note_key(note_id))
+
+
+def stats():
+    return note_cache.stats()
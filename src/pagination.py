@@ -0,0 +1,54 @@
+import base64
+import datetime
+import hashlib
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe cursor for the keyset ``values`` of the last row of a page."""
+    payload = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if len(payload) != len(types):
+            raise ValueError("wrong cursor arity")
+        return tuple(
+            datetime.datetime.fromisoformat(value) if kind is datetime.datetime else kind(value)
+            for kind, value in zip(types, payload)
+        )
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def etag(*parts):
+    """Weak ETag derived from whatever identifies a representation."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def revision_etag(revision: int):
+    return f'"{revision}"'
+
+
+def if_match_revision(if_match: str):
+    """The revision named by an ``If-Match`` header holding one of our
+    revision ETags; ``None`` for a missing header or ``*``. Raises
+    ``ValueError`` for anything else."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    return int(if_match.strip().removeprefix("W/").strip('"'))
+
+
+def etag_matches(if_none_match: str, current: str):
+    if not if_none_match:
+        return False
+    candidates = {value.strip() for value in if_none_match.split(",")}
+    return "*" in candidates or current in candidates or current.removeprefix("W/") in candidates
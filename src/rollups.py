@@ -0,0 +1,234 @@
+"""Time-bucketed activity rollups for trend queries.
+
+Every write adds to an hourly and a daily ``AnalyticsRollup`` row (notes
+created/edited/deleted, words added/removed) and to the ``RollupWord``
+counts of the words it added, in the writer's transaction. Trend queries
+read one row per bucket instead of rescanning notes and versions.
+
+``compact`` drops hourly rows older than ``ROLLUP_HOURLY_DAYS`` and trims
+closed buckets to their ``ROLLUP_TOP_WORDS`` words; ``rebuild`` backfills
+from ``notes.created_at`` and ``note_versions.created_at``. Both run as
+``python -m src.rollups {compact|rebuild}``. Bucket starts are naive UTC.
+"""
+import datetime
+import sys
+from collections import Counter
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from src.config import settings
+from src.database import dialect_insert
+from src.models import AnalyticsRollup, Note, NoteVersion, RollupWord
+
+GRANULARITIES = {"hour": datetime.timedelta(hours=1), "day": datetime.timedelta(days=1)}
+COUNTERS = ("notes_created", "notes_edited", "notes_deleted", "words_added", "words_removed")
+MAX_POINTS = 1000
+REBUILD_BATCH_SIZE = 1000
+
+
+def to_utc(moment: datetime.datetime):
+    """Naive UTC for ``moment``; naive values are taken to be UTC already."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def bucket_start(moment: datetime.datetime, granularity: str):
+    moment = to_utc(moment).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if granularity == "day" else moment
+
+
+def _upsert(db: Session, counters: dict, words: Counter):
+    """Add ``{(granularity, start): {counter: n}}`` and
+    ``{(granularity, start, word): n}`` to the rollup tables."""
+    insert = dialect_insert(db)
+    if counters:
+        stmt = insert(AnalyticsRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalyticsRollup.granularity, AnalyticsRollup.bucket_start],
+            set_={name: getattr(AnalyticsRollup, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+        )
+        db.execute(stmt, [
+            dict({name: values.get(name, 0) for name in COUNTERS}, granularity=granularity, bucket_start=start)
+            for (granularity, start), values in counters.items()
+        ])
+    if words:
+        stmt = insert(RollupWord)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RollupWord.granularity, RollupWord.bucket_start, RollupWord.word],
+            set_={"count": RollupWord.count + stmt.excluded.count},
+        )
+        db.execute(stmt, [
+            {"granularity": granularity, "bucket_start": start, "word": word, "count": count}
+            for (granularity, start, word), count in words.items()
+        ])
+
+
+def record(db: Session, moment: datetime.datetime, created: int = 0, edited: int = 0, deleted: int = 0,
+           delta: Counter = None):
+    """Stage the rollup updates for writes at ``moment`` whose net word
+    changes are ``delta``. Runs inside the caller's transaction."""
+    delta = delta or Counter()
+    values = {
+        "notes_created": created,
+        "notes_edited": edited,
+        "notes_deleted": deleted,
+        "words_added": sum(count for count in delta.values() if count > 0),
+        "words_removed": -sum(count for count in delta.values() if count < 0),
+    }
+    if not any(values.values()):
+        return
+    counters = {}
+    words = Counter()
+    for granularity in GRANULARITIES:
+        start = bucket_start(moment, granularity)
+        counters[(granularity, start)] = values
+        words.update({(granularity, start, word): count for word, count in delta.items() if count > 0})
+    _upsert(db, counters, words)
+
+
+def record_history(db: Session, created: list, edited: list = ()):
+    """Backfill form of ``record``: ``created`` holds ``(created_at, words)``
+    per note, ``edited`` the ``created_at`` of each version row."""
+    counters = {}
+    words = Counter()
+    for moment, note_words in created:
+        if moment is None:
+            continue
+        note_counts = Counter(note_words)
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(moment, granularity))
+            counters.setdefault(key, Counter()).update(notes_created=1, words_added=len(note_words))
+            words.update({key + (word,): count for word, count in note_counts.items()})
+    for moment in edited:
+        if moment is None:
+            continue
+        for granularity in GRANULARITIES:
+            counters.setdefault((granularity, bucket_start(moment, granularity)), Counter()).update(notes_edited=1)
+    _upsert(db, counters, words)
+
+
+def timeseries(db: Session, start: datetime.datetime, end: datetime.datetime, granularity: str = "day",
+               top_words: int = 5):
+    """One point per ``granularity`` bucket from the bucket holding
+    ``start`` up to ``end`` (exclusive), empty buckets included.
+
+    Raises ``ValueError`` for more than ``MAX_POINTS`` buckets.
+    """
+    step = GRANULARITIES[granularity]
+    first = bucket_start(start, granularity)
+    end = to_utc(end)
+    if (end - first) / step > MAX_POINTS:
+        raise ValueError(f"More than {MAX_POINTS} {granularity} buckets requested")
+    points = {}
+    moment = first
+    while moment < end:
+        points[moment] = dict({name: 0 for name in COUNTERS}, start=moment, top_words=[])
+        moment += step
+
+    in_range = (RollupWord.granularity == granularity, RollupWord.bucket_start >= first, RollupWord.bucket_start < end)
+    rows = db.execute(
+        select(AnalyticsRollup).where(
+            AnalyticsRollup.granularity == granularity,
+            AnalyticsRollup.bucket_start >= first,
+            AnalyticsRollup.bucket_start < end,
+        )
+    ).scalars()
+    for row in rows:
+        points[row.bucket_start].update({name: getattr(row, name) for name in COUNTERS})
+    if top_words:
+        ranked = select(
+            RollupWord.bucket_start,
+            RollupWord.word,
+            RollupWord.count,
+            func.row_number().over(
+                partition_by=RollupWord.bucket_start, order_by=(RollupWord.count.desc(), RollupWord.word)
+            ).label("rank"),
+        ).where(*in_range).subquery()
+        for bucket, word, count in db.execute(
+            select(ranked.c.bucket_start, ranked.c.word, ranked.c.count)
+            .where(ranked.c.rank <= top_words)
+            .order_by(ranked.c.bucket_start, ranked.c.rank)
+        ):
+            points[bucket]["top_words"].append((word, count))
+    return list(points.values())
+
+
+def compact(db: Session, hourly_days: float = None, top_words: int = None):
+    """Drop hourly buckets older than ``hourly_days`` and keep only the top
+    ``top_words`` words of every closed bucket."""
+    hourly_days = settings.rollup_hourly_days if hourly_days is None else hourly_days
+    top_words = settings.rollup_top_words if top_words is None else top_words
+    now = to_utc(datetime.datetime.now(datetime.timezone.utc))
+    cutoff = bucket_start(now - datetime.timedelta(days=hourly_days), "hour")
+    result = {"hourly_deleted": 0, "buckets_trimmed": 0}
+    result["hourly_deleted"] = db.execute(
+        delete(AnalyticsRollup).where(AnalyticsRollup.granularity == "hour", AnalyticsRollup.bucket_start < cutoff)
+    ).rowcount
+    db.execute(delete(RollupWord).where(RollupWord.granularity == "hour", RollupWord.bucket_start < cutoff))
+    db.commit()
+
+    for granularity in GRANULARITIES:
+        crowded = db.execute(
+            select(RollupWord.bucket_start)
+            .where(RollupWord.granularity == granularity, RollupWord.bucket_start < bucket_start(now, granularity))
+            .group_by(RollupWord.bucket_start)
+            .having(func.count() > top_words)
+        ).scalars().all()
+        for start in crowded:
+            in_bucket = (RollupWord.granularity == granularity, RollupWord.bucket_start == start)
+            keep = select(RollupWord.word).where(*in_bucket).order_by(RollupWord.count.desc(), RollupWord.word)
+            db.execute(delete(RollupWord).where(*in_bucket, RollupWord.word.not_in(keep.limit(top_words))))
+            db.commit()
+        result["buckets_trimmed"] += len(crowded)
+    return result
+
+
+def ensure_backfill(db: Session):
+    """Rebuild the rollups of a database whose notes predate them."""
+    if db.execute(select(AnalyticsRollup.granularity).limit(1)).first() is not None:
+        return False
+    if db.execute(select(Note.id).limit(1)).first() is None:
+        return False
+    rebuild(db)
+    return True
+
+
+def rebuild(db: Session):
+    """Recompute the rollups from note and version timestamps.
+
+    Notes count as created with their current content, deletions are not
+    recoverable and versions only count as edits.
+    """
+    from src.analytics import tokenize
+
+    db.execute(delete(RollupWord))
+    db.execute(delete(AnalyticsRollup))
+    notes = db.execute(select(Note.created_at, Note.content).execution_options(yield_per=REBUILD_BATCH_SIZE))
+    batch = []
+    for created_at, content in notes:
+        batch.append((created_at, tokenize(content)))
+        if len(batch) == REBUILD_BATCH_SIZE:
+            record_history(db, batch)
+            batch = []
+    record_history(db, batch)
+    edits = db.execute(select(NoteVersion.created_at).execution_options(yield_per=REBUILD_BATCH_SIZE)).scalars()
+    batch = []
+    for created_at in edits:
+        batch.append(created_at)
+        if len(batch) == REBUILD_BATCH_SIZE:
+            record_history(db, [], batch)
+            batch = []
+    record_history(db, [], batch)
+    db.commit()
+    return compact(db)
+
+
+COMMANDS = {"compact": compact, "rebuild": rebuild}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in COMMANDS:
+        sys.exit("usage: python -m src.rollups {compact|rebuild}")
+    from src.database import SessionLocal
+
+    with SessionLocal() as session:
+        print(COMMANDS[sys.argv[1]](session))
@@ -1,31 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException
+import datetime
+import uuid
+import orjson
+from typing import Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from src import crud, database
+from src import crud, database, jobs, llm, note_cache, pagination, rollups, search, similarity, transfer, versions
+from src.config import settings
 from src import services
 from src import schemas
 
 crud_router = APIRouter()
+versions_router = APIRouter()
 ai_router = APIRouter()
+# Included ahead of the note routers so /notes/export is not read as a note id.
+transfer_router = APIRouter()
 
 
 @crud_router.post("/notes/", response_model=schemas.Note)
 def create_note(note: schemas.NoteCreate, db: Session = Depends(database.get_db)):
-    return crud.create_note(db, title=note.title, content=note.content)
+    created = crud.create_note(db, title=note.title, content=note.content)
+    return note_json(created.revision, serialize_note(created))
+
+
+@crud_router.post("/notes:bulk", response_model=schemas.BulkResponse)
+def bulk_notes(request: schemas.BulkRequest, db: Session = Depends(database.get_db)):
+    results = crud.bulk_apply(db, [operation.model_dump() for operation in request.operations])
+    return {"results": results}
+
+
+@transfer_router.get("/notes/export", response_class=StreamingResponse)
+def export_notes(
+    include_versions: bool = Query(False, alias="versions", description="Follow each note with its version history."),
+    accept_encoding: Optional[str] = Header(None),
+    session_factory=Depends(database.get_session_factory),
+):
+    """Stream every note as NDJSON, gzipped when the client accepts it."""
+    gzip = "gzip" in (accept_encoding or "")
+    headers = {"Content-Disposition": 'attachment; filename="notes.ndjson"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        transfer.export_chunks(session_factory, include_versions, gzip), media_type=transfer.MEDIA_TYPE, headers=headers
+    )
+
+
+@transfer_router.post("/notes/import", response_model=schemas.ImportResult)
+async def import_notes(
+    request: Request,
+    import_id: Optional[str] = Query(None, max_length=64, description="Resume the import with this id."),
+    keep_ids: bool = Query(True, description="Keep exported note ids instead of assigning new ones."),
+    session_factory=Depends(database.get_session_factory),
+):
+    """Import an NDJSON (optionally gzipped) upload in batched transactions."""
+    import_id = import_id or uuid.uuid4().hex
+    try:
+        return await transfer.import_stream(session_factory, request.stream(), import_id, keep_ids)
+    except transfer.InvalidRecord as e:
+        raise HTTPException(status_code=400, detail=f"{e}; resume with import_id={import_id}")
+    except IntegrityError:
+        raise HTTPException(
+            status_code=409, detail=f"Note ids already exist, import with keep_ids=false; resume with import_id={import_id}"
+        )
+
+
+@transfer_router.get("/notes/import/{import_id}", response_model=schemas.ImportResult)
+def read_import(import_id: str, db: Session = Depends(database.get_db)):
+    checkpoint = transfer.get_checkpoint(db, import_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return {
+        "import_id": import_id, "lines": checkpoint.lines, "notes": checkpoint.notes, "versions": checkpoint.versions,
+    }
+
+
+class NotePageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+        limit: int = Query(50, ge=1, le=500),
+        fields: Optional[str] = Query(
+            None, description="Comma-separated subset of fields; id and updated_at are always included."
+        ),
+        if_none_match: Optional[str] = Header(None),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.if_none_match = if_none_match
+        self.fields = crud.NOTE_FIELDS
+        if fields:
+            requested = {field.strip() for field in fields.split(",") if field.strip()}
+            unknown = requested - set(crud.NOTE_FIELDS)
+            if unknown:
+                raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+            self.fields = tuple(field for field in crud.NOTE_FIELDS if field in requested | {"id", "updated_at"})
+        try:
+            self.after = pagination.decode_cursor(cursor, datetime.datetime, int) if cursor else None
+        except pagination.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def page(self, rows: list):
+        """The page as a ready ``Response``: rows are plain column values,
+        so they go straight to orjson without a response model pass."""
+        next_cursor = None
+        if len(rows) == self.limit:
+            next_cursor = pagination.encode_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+        tag = pagination.etag(self.fields, self.cursor, self.limit, [(row["id"], row["updated_at"]) for row in rows])
+        if pagination.etag_matches(self.if_none_match, tag):
+            return Response(status_code=304, headers={"ETag": tag})
+        body = orjson.dumps({"items": [dict(row) for row in rows], "next_cursor": next_cursor})
+        return Response(content=body, media_type="application/json", headers={"ETag": tag})
+
+
+@crud_router.get("/notes/", response_model=schemas.NotePage)
+def list_notes(params: NotePageParams = Depends(), db: Session = Depends(database.get_db)):
+    rows = crud.list_notes(db, after=params.after, limit=params.limit, fields=params.fields)
+    return params.page(rows)
+
+
+@crud_router.get("/notes/search", response_model=schemas.NoteSearchResults)
+def search_notes(
+    q: str = Query(..., min_length=1, description="Words that must all appear in the title or content."),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(database.get_db),
+):
+    hits = search.search_notes(db, q, limit=limit + 1, offset=offset)
+    return search_page(hits, limit, offset)
+
+
+def search_page(hits: list, limit: int, offset: int):
+    return {"items": hits[:limit], "limit": limit, "offset": offset, "has_more": len(hits) > limit}
+
+
+def note_json(revision: int, body: bytes):
+    return Response(content=body, media_type="application/json", headers={"ETag": pagination.revision_etag(revision)})
+
+
+def serialize_note(note):
+    return schemas.Note.model_validate(note).model_dump_json().encode()
+
+
+def cache_note(note, token: int):
+    """Serialize ``note`` once and keep the bytes in the read cache unless it
+    was invalidated since ``token`` (``note_cache.generation``) was taken."""
+    body = serialize_note(note)
+    note_cache.put(note.id, note.revision, body, token)
+    return note.revision, body
+
+
+def expected_revision(if_match: Optional[str] = Header(None)):
+    try:
+        return pagination.if_match_revision(if_match)
+    except ValueError:
+        raise HTTPException(status_code=412, detail="If-Match must be an ETag returned for this note")
 
 
 @crud_router.get("/notes/{note_id}", response_model=schemas.Note)
 def read_note(note_id: int, db: Session = Depends(database.get_db)):
-    note = crud.get_note(db, note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    return note
+    cached = note_cache.get(note_id)
+    if cached is None:
+        token = note_cache.generation(note_id)
+        note = crud.get_note(db, note_id)
+        if not note:
+            raise HTTPException(status_code=404, detail="Note not found")
+        cached = cache_note(note, token)
+    return note_json(*cached)
 
 @crud_router.put("/notes/{note_id}", response_model=schemas.Note)
-def update_note(note_id: int, note: schemas.NoteUpdate, db: Session = Depends(database.get_db)):
-    updated_note = crud.update_note(db, note_id, content=note.content)
+def update_note(
+    note_id: int,
+    note: schemas.NoteUpdate,
+    revision: Optional[int] = Depends(expected_revision),
+    db: Session = Depends(database.get_db),
+):
+    updated_note = crud.update_note(db, note_id, content=note.content, expected_revision=revision)
     if not updated_note:
         raise HTTPException(status_code=404, detail="Note not found")
-    return updated_note
+    return note_json(updated_note.revision, serialize_note(updated_note))
 
 
 @crud_router.delete("/notes/{note_id}", response_model=dict)
@@ -36,17 +189,138 @@ def delete_note(note_id: int, db: Session = Depends(database.get_db)):
     return {"message": "Note deleted"}
 
 
+@versions_router.get("/notes/{note_id}/versions", response_model=schemas.NoteVersionPage)
+def list_versions(
+    note_id: int,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+    limit: int = Query(50, ge=1, le=500),
+    since: Optional[datetime.datetime] = Query(None, description="Only versions created at or after this time."),
+    until: Optional[datetime.datetime] = Query(None, description="Only versions created before this time."),
+    content: bool = Query(False, description="Include the content of each version."),
+    db: Session = Depends(database.get_db),
+):
+    note = crud.get_note(db, note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    try:
+        before = pagination.decode_cursor(cursor, datetime.datetime, int) if cursor else None
+    except pagination.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # created_at is stored as naive UTC.
+    since, until = (rollups.to_utc(moment) if moment else None for moment in (since, until))
+    rows = crud.list_versions(db, note_id, before, limit, since, until, with_data=content)
+    items = [
+        {"revision": row.revision, "created_at": row.created_at, "size": row.size or 0, "is_snapshot": row.is_snapshot}
+        for row in rows
+    ]
+    if content:
+        for item, text in zip(items, versions.page_contents(db, note, rows)):
+            item["content"] = text
+    next_cursor = pagination.encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@versions_router.get("/notes/{note_id}/versions/{revision}", response_model=schemas.NoteVersion)
+def read_version(note_id: int, revision: int, db: Session = Depends(database.get_db)):
+    note = crud.get_note(db, note_id)
+    found = versions.get_version(db, note, revision) if note else None
+    if not found:
+        raise HTTPException(status_code=404, detail="Version not found")
+    version, content = found
+    return {"note_id": note_id, "revision": revision, "created_at": version.created_at, "content": content}
+
+
 @ai_router.post("/notes/{note_id}/summarize", response_model=schemas.NoteSummary)
-def summarize_note(note_id: int, db: Session = Depends(database.get_db)):
-    summary = services.summarize_note(db, note_id)
+async def summarize_note(note_id: int, session_factory=Depends(database.get_session_factory)):
+    summary = await services.summarize_note_async(note_id, session_factory)
     if not summary:
         raise HTTPException(status_code=404, detail="Note not found")
     return {"id": note_id, "summary": summary}
 
 
+@ai_router.post("/notes/summarize:batch", response_model=schemas.SummaryJob, status_code=202)
+def summarize_notes_batch(
+    request: schemas.SummaryBatchRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(database.get_db),
+    session_factory=Depends(database.get_session_factory),
+):
+    if not services.ai_enabled():
+        raise llm.ModelUnavailable(f"Model provider {settings.model_provider!r} is disabled")
+    if request.ids is not None:
+        note_ids = request.ids
+    else:
+        note_ids = crud.find_note_ids(db, request.title_contains, limit=settings.batch_max_notes)
+    job = jobs.create_job(note_ids)
+    background_tasks.add_task(jobs.run_job, job, session_factory)
+    return job.to_dict()
+
+
+@ai_router.get("/jobs/{job_id}", response_model=schemas.SummaryJob)
+def read_job(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
 @ai_router.get("/analytics/", response_model=schemas.NoteAnalytics)
-def analyze_notes(db: Session = Depends(database.get_db)):
-    analytics = services.analyze_notes(db)
+def analyze_notes(
+    k: int = Query(3, ge=1, le=100, description="Number of longest/shortest notes to report."),
+    mode: Optional[Literal["incremental", "scan", "batch"]] = Query(
+        None, description="Analytics engine; defaults to the ANALYTICS_MODE setting."
+    ),
+    stop_words: bool = Query(False, description="Exclude NLTK English stop words from most_common_words."),
+    db: Session = Depends(database.get_db),
+):
+    try:
+        analytics = services.analyze_notes(db, mode=mode, k=k, stop_words=stop_words)
+    except LookupError:
+        raise HTTPException(status_code=503, detail="Stop-word corpus is not installed")
     if not analytics:
         raise HTTPException(status_code=404, detail="No notes available for analysis")
     return analytics
+
+
+@ai_router.get("/analytics/timeseries", response_model=schemas.Timeseries)
+def analytics_timeseries(
+    start: Optional[datetime.datetime] = Query(
+        None, alias="from", description="Start of the range (UTC when naive); defaults to the last 30 buckets."
+    ),
+    end: Optional[datetime.datetime] = Query(None, alias="to", description="End of the range; defaults to now."),
+    bucket: Literal["hour", "day"] = Query("day"),
+    top_words: int = Query(5, ge=0, le=50, description="Most added words to report per bucket."),
+    db: Session = Depends(database.get_db),
+):
+    end = rollups.to_utc(end or datetime.datetime.now(datetime.timezone.utc))
+    start = rollups.to_utc(start) if start else rollups.bucket_start(end, bucket) - 29 * rollups.GRANULARITIES[bucket]
+    if start >= end:
+        raise HTTPException(status_code=422, detail="`from` must be before `to`")
+    try:
+        points = rollups.timeseries(db, start, end, bucket, top_words)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"bucket": bucket, "points": points}
+
+
+@ai_router.get("/notes/{note_id}/similar", response_model=schemas.SimilarNotes)
+def similar_notes(
+    note_id: int,
+    threshold: float = Query(0.5, ge=0, le=1, description="Minimum estimated Jaccard similarity."),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+):
+    note = crud.get_note(db, note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return {"items": similarity.similar_notes(db, note, threshold=threshold, limit=limit)}
+
+
+@ai_router.get("/analytics/duplicates", response_model=schemas.DuplicateReport)
+def duplicate_clusters(
+    threshold: float = Query(0.8, ge=0, le=1, description="Minimum estimated Jaccard similarity of linked notes."),
+    min_size: int = Query(2, ge=2),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(database.get_db),
+):
+    return {"clusters": similarity.duplicate_clusters(db, threshold=threshold, min_size=min_size, limit=limit)}
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from datetime import datetime
-from typing import List
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 
 
 class NoteBase(BaseModel):
@@ -17,12 +17,90 @@ class NoteUpdate(BaseModel):
 
 
 class Note(NoteBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
+    revision: int
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+
+class BulkCreate(NoteBase):
+    op: Literal["create"]
+
+
+class BulkUpdate(NoteUpdate):
+    op: Literal["update"]
+    id: int
+
+
+class BulkDelete(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+
+class BulkRequest(BaseModel):
+    operations: List[Annotated[Union[BulkCreate, BulkUpdate, BulkDelete], Field(discriminator="op")]] = Field(
+        ..., min_length=1, max_length=5000
+    )
+
+
+class BulkResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    status: Literal["created", "updated", "deleted", "not_found"]
+
+
+class BulkResponse(BaseModel):
+    results: List[BulkResult]
+
+
+class NotePage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+class NoteVersionInfo(BaseModel):
+    revision: int
+    created_at: datetime
+    size: int
+    is_snapshot: bool
+    content: Optional[str] = None
+
+
+class NoteVersionPage(BaseModel):
+    items: List[NoteVersionInfo]
+    next_cursor: Optional[str] = None
+
+
+class NoteVersion(BaseModel):
+    note_id: int
+    revision: int
+    created_at: datetime
+    content: str
+
+
+class NoteSearchHit(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    rank: Optional[float] = None
+
+
+class NoteSearchResults(BaseModel):
+    items: List[NoteSearchHit]
+    limit: int
+    offset: int
+    has_more: bool
+
+
+class ImportResult(BaseModel):
+    import_id: str
+    lines: int
+    notes: int
+    versions: int
+    skipped_lines: int = 0
 
 
 class NoteSummary(BaseModel):
@@ -30,9 +108,92 @@ class NoteSummary(BaseModel):
     summary: str
 
 
+class SummaryBatchRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=1000)
+    title_contains: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if self.ids is None and self.title_contains is None:
+            raise ValueError("Provide either ids or title_contains")
+        return self
+
+
+class JobResult(BaseModel):
+    id: int
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+class SummaryJob(BaseModel):
+    id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    results: List[JobResult]
+
+
+class LengthHistogram(BaseModel):
+    bin_edges: List[float]
+    counts: List[int]
+
+
+class LengthDistribution(BaseModel):
+    min: int
+    max: int
+    mean: float
+    std: float
+    percentiles: Dict[str, float]
+    histogram: LengthHistogram
+
+
 class NoteAnalytics(BaseModel):
     total_word_count: int
     average_note_length: float
     most_common_words: List[tuple[str, int]]
     top_3_longest_notes: List[dict]
     top_3_shortest_notes: List[dict]
+    length_distribution: Optional[LengthDistribution] = None
+
+
+class SimilarNote(BaseModel):
+    id: int
+    title: Optional[str] = None
+    similarity: float
+
+
+class SimilarNotes(BaseModel):
+    items: List[SimilarNote]
+
+
+class NoteRef(BaseModel):
+    id: int
+    title: Optional[str] = None
+
+
+class DuplicateCluster(BaseModel):
+    notes: List[NoteRef]
+    size: int
+    min_similarity: float
+
+
+class DuplicateReport(BaseModel):
+    clusters: List[DuplicateCluster]
+
+
+class TimeseriesPoint(BaseModel):
+    start: datetime
+    notes_created: int
+    notes_edited: int
+    notes_deleted: int
+    words_added: int
+    words_removed: int
+    top_words: List[tuple[str, int]]
+
+
+class Timeseries(BaseModel):
+    bucket: Literal["hour", "day"]
+    points: List[TimeseriesPoint]
@@ -0,0 +1,134 @@
+import sys
+from sqlalchemy import select, text, and_, func, or_
+from sqlalchemy.orm import Session
+from src.models import Note
+
+SNIPPET_TOKENS = 12
+TITLE_WEIGHT = 2.0
+CONTENT_WEIGHT = 1.0
+
+SEARCH_SQL = text(
+    "SELECT notes.id, notes.title, "
+    "snippet(notes_fts, -1, '[', ']', '...', :snippet_tokens) AS snippet, "
+    "bm25(notes_fts, :title_weight, :content_weight) AS rank "
+    "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+    "WHERE notes_fts MATCH :query "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+
+def uses_fts(db: Session):
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def index_note(db: Session, note_id: int, title: str, content: str):
+    index_notes(db, [{"id": note_id, "title": title, "content": content}])
+
+
+def unindex_note(db: Session, note_id: int, title: str, content: str):
+    unindex_notes(db, [{"id": note_id, "title": title, "content": content}])
+
+
+def index_notes(db: Session, rows: list):
+    """Add ``{"id", "title", "content"}`` rows to the index (executemany)."""
+    if rows and uses_fts(db):
+        db.execute(text("INSERT INTO notes_fts(rowid, title, content) VALUES (:id, :title, :content)"), rows)
+
+
+def unindex_notes(db: Session, rows: list):
+    # External-content FTS5 tables need the indexed values to remove a row.
+    if rows and uses_fts(db):
+        db.execute(
+            text("INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', :id, :title, :content)"),
+            rows,
+        )
+
+
+def fts_query(query: str):
+    """Turn free text into an FTS5 query matching every term literally,
+    so user input can never be parsed as FTS5 syntax."""
+    terms = query.split()
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _fallback_snippet(content: str, terms: list):
+    lowered = (content or "").lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    start = min((position for position in positions if position >= 0), default=0)
+    words = (content or "")[start:].split()
+    snippet = " ".join(words[:SNIPPET_TOKENS])
+    return snippet + ("..." if len(words) > SNIPPET_TOKENS else "")
+
+
+def _fallback_search(db: Session, query: str, limit: int, offset: int):
+    terms = query.split()
+    # Escaped, so "%" and "_" in the query match literally.
+    conditions = [
+        or_(
+            func.lower(Note.title).contains(term.lower(), autoescape=True),
+            func.lower(Note.content).contains(term.lower(), autoescape=True),
+        )
+        for term in terms
+    ]
+    rows = db.execute(
+        select(Note.id, Note.title, Note.content)
+        .where(and_(*conditions))
+        .order_by(Note.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+    return [
+        {"id": note_id, "title": title, "snippet": _fallback_snippet(content, terms), "rank": None}
+        for note_id, title, content in rows
+    ]
+
+
+def search_notes(db: Session, query: str, limit: int = 20, offset: int = 0):
+    """Ranked full-text search; uses FTS5/bm25 on SQLite and a
+    case-insensitive LIKE scan on other backends."""
+    if not query.split():
+        return []
+    if not uses_fts(db):
+        return _fallback_search(db, query, limit, offset)
+    rows = db.execute(
+        SEARCH_SQL,
+        {
+            "query": fts_query(query),
+            "snippet_tokens": SNIPPET_TOKENS,
+            "title_weight": TITLE_WEIGHT,
+            "content_weight": CONTENT_WEIGHT,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def ensure_index(db: Session):
+    """Rebuild the index if it does not cover every note, e.g. on a
+    database created before the index existed. Removing a row that was
+    never indexed would otherwise corrupt the FTS5 table."""
+    if not uses_fts(db):
+        return False
+    indexed = db.execute(text("SELECT count(*) FROM notes_fts_docsize")).scalar()
+    notes = db.execute(text("SELECT count(*) FROM notes")).scalar()
+    if indexed == notes:
+        return False
+    rebuild(db)
+    return True
+
+
+def rebuild(db: Session):
+    """Re-create the FTS index from the notes table."""
+    if uses_fts(db):
+        db.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+        db.commit()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m src.search rebuild")
+    from src.database import SessionLocal
+
+    with SessionLocal() as session:
+        rebuild(session)
@@ -1,60 +1,369 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
 import os
+import threading
 from sqlalchemy.orm import Session
 from collections import Counter
 import numpy as np
-from src import crud
-import google.generativeai as genai
+from src import analytics, chunking, crud, llm
+from src.cache import LRUCache
+from src.config import settings
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+# google.generativeai pulls in protobuf and grpc; import it on first use.
+genai = llm.LazyModule("google.generativeai")
 model = None
+_model_lock = threading.Lock()
+summary_cache = LRUCache(settings.summary_cache_size)
+summary_counters = Counter()
+summary_flight = llm.SingleFlight()
+
+
+def _gemini_model():
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set.")
+    genai.configure(api_key=gemini_api_key)
+    return genai.GenerativeModel(settings.gemini_model_name)
+
+
+MODEL_PROVIDERS = {
+    "gemini": _gemini_model,
+    "fake": lambda: llm.FakeModel(latency=settings.fake_model_latency),
+}
+
+
+def ai_enabled():
+    return settings.model_provider in MODEL_PROVIDERS
+
 
 def get_gemini_model():
+    """The configured model client, created on first use."""
     global model
     if model is None:
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-        if not gemini_api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set.")
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        with _model_lock:
+            if model is None:
+                if not ai_enabled():
+                    raise llm.ModelUnavailable(f"Model provider {settings.model_provider!r} is disabled")
+                model = MODEL_PROVIDERS[settings.model_provider]()
     return model
 
-def summarize_note(db: Session, note_id: int):
-    note = crud.get_note(db, note_id)
-    if not note:
-        return None
 
-    model = get_gemini_model()
+async def get_model_async():
+    # The first call imports and configures the client: keep it off the loop.
+    return await asyncio.to_thread(get_gemini_model)
 
-    prompt = f"Summarize the following note: {note.content}"
+
+def warm_model():
+    """Create the model client ahead of the first request (MODEL_INIT=background)."""
     try:
-        response = model.generate_content(prompt)
-        summary = response.text.strip()
-        return summary
+        get_gemini_model()
     except Exception as e:
-        print(f"Error during summarization: {e}")
+        logger.warning("Model warm-up failed, retrying on first use: %s", e)
+
+def content_hash(content: str):
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def summary_key(note_id: int, content: str):
+    return note_id, content_hash(content), settings.gemini_model_name
+
+
+def summary_prompt(content: str):
+    return f"Summarize the following note: {content}"
+
+
+def lookup_summary(db: Session, key: tuple):
+    summary = summary_cache.get(key)
+    if summary is not None:
+        summary_counters["memory_hits"] += 1
+        return summary
+    summary = crud.get_cached_summary(db, *key)
+    if summary is not None:
+        summary_counters["store_hits"] += 1
+        summary_cache.set(key, summary)
+        return summary
+    summary_counters["misses"] += 1
+    return None
+
+
+def store_summary(db: Session, key: tuple, summary: str):
+    crud.save_summary(db, *key, summary)
+    summary_cache.set(key, summary)
+
+
+def chunk_prompt(chunk: str):
+    return f"Summarize the following section of a longer note: {chunk}"
+
+
+def reduce_prompt(partials: list):
+    sections = "\n\n".join(f"{index}. {partial}" for index, partial in enumerate(partials, 1))
+    return f"Combine these summaries of consecutive sections of one note into a single summary:\n\n{sections}"
+
+
+def _lookup_chunk_summaries(session_factory, chunk_hashes: list):
+    found = {}
+    for chunk_hash in chunk_hashes:
+        summary = summary_cache.get(("chunk", chunk_hash, settings.gemini_model_name))
+        if summary is not None:
+            found[chunk_hash] = summary
+    missing = [chunk_hash for chunk_hash in chunk_hashes if chunk_hash not in found]
+    if missing:
+        with session_factory() as db:
+            stored = crud.get_chunk_summaries(db, missing, settings.gemini_model_name)
+        for chunk_hash, summary in stored.items():
+            summary_cache.set(("chunk", chunk_hash, settings.gemini_model_name), summary)
+        found.update(stored)
+    return found
+
+
+def _store_chunk_summaries(session_factory, summaries: dict):
+    with session_factory() as db:
+        crud.save_chunk_summaries(db, summaries, settings.gemini_model_name)
+    for chunk_hash, summary in summaries.items():
+        summary_cache.set(("chunk", chunk_hash, settings.gemini_model_name), summary)
+
+
+def _group_by_size(texts: list, max_chars: int):
+    groups = [[]]
+    size = 0
+    for text in texts:
+        if groups[-1] and size + len(text) > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(text)
+        size += len(text)
+    return groups
+
+
+async def _reduce(model, partials: list, max_wait: float = None):
+    """Combine partial summaries, in several rounds if they do not fit one prompt."""
+    while len(partials) > 1:
+        groups = _group_by_size(partials, settings.summary_chunk_chars)
+        if len(groups) == 1 or len(groups) == len(partials):
+            break
+        partials = await asyncio.gather(
+            *(
+                llm.generate(model, reduce_prompt(group), max_wait=max_wait) if len(group) > 1 else _ready(group[0])
+                for group in groups
+            )
+        )
+    if len(partials) == 1:
+        return partials[0]
+    return await llm.generate(model, reduce_prompt(partials), max_wait=max_wait)
+
+
+async def _ready(value):
+    return value
+
+
+async def summarize_content(model, content: str, session_factory, max_wait: float = None):
+    """Summarize ``content`` with one prompt, or map-reduce it when it is
+    longer than ``SUMMARY_CHUNK_CHARS``.
+
+    Chunk summaries are cached by chunk hash, so after an edit only the
+    chunks that actually changed are sent to the model again.
+    """
+    if len(content) <= settings.summary_chunk_chars:
+        return await llm.generate(model, summary_prompt(content), max_wait=max_wait)
+
+    chunks = chunking.split_text(content, settings.summary_chunk_chars)
+    chunk_hashes = [content_hash(chunk) for chunk in chunks]
+    cached = await asyncio.to_thread(_lookup_chunk_summaries, session_factory, chunk_hashes)
+    missing = {
+        chunk_hash: chunk for chunk_hash, chunk in zip(chunk_hashes, chunks) if chunk_hash not in cached
+    }
+    generated = await asyncio.gather(
+        *(llm.generate(model, chunk_prompt(chunk), max_wait=max_wait) for chunk in missing.values())
+    )
+    fresh = dict(zip(missing, generated))
+    if fresh:
+        await asyncio.to_thread(_store_chunk_summaries, session_factory, fresh)
+    partials = [cached.get(chunk_hash) or fresh[chunk_hash] for chunk_hash in chunk_hashes]
+    return await _reduce(model, partials, max_wait)
+
+
+def _prepare_summary(session_factory, note_id: int):
+    with session_factory() as db:
+        note = crud.get_note(db, note_id)
+        if not note:
+            return None
+        key = summary_key(note.id, note.content)
+        return key, note.content, lookup_summary(db, key)
+
+
+def _store_summary(session_factory, key: tuple, summary: str):
+    with session_factory() as db:
+        store_summary(db, key, summary)
+
+
+async def summarize_note_async(note_id: int, session_factory):
+    """Summary of a note, from the caches or the model.
+
+    The note is read and the result stored in short worker-thread sessions,
+    so no connection is held while the model call is in flight. Concurrent
+    requests for the same note content share one model call. Raises
+    ``llm.ModelCallError`` and ``llm.RateLimited`` instead of returning
+    ``None``, which means the note does not exist.
+    """
+    prepared = await asyncio.to_thread(_prepare_summary, session_factory, note_id)
+    if prepared is None:
         return None
+    key, content, summary = prepared
+    if summary is not None:
+        return summary
+    model = await get_model_async()
+
+    async def summarize():
+        summary = await summarize_content(model, content, session_factory)
+        await asyncio.to_thread(_store_summary, session_factory, key, summary)
+        return summary
+
+    try:
+        return await summary_flight.do(key, summarize)
+    except llm.ModelCallError as e:
+        logger.warning("Summarization of note %s failed: %s", note_id, e)
+        raise
+
+
+def summary_cache_stats():
+    """``memory_hits`` are served by the LRU, ``store_hits`` by the
+    note_summaries table; ``misses`` required a model call and ``coalesced``
+    requests waited for another request's identical call."""
+    memory = summary_cache.stats()
+    return {
+        "memory_hits": summary_counters["memory_hits"],
+        "store_hits": summary_counters["store_hits"],
+        "misses": summary_counters["misses"],
+        "coalesced": summary_flight.shared,
+        "memory_size": memory["size"],
+        "memory_evictions": memory["evictions"],
+    }
+
+
+def analyze_notes(db: Session, mode: str = None, k: int = 3, stop_words: bool = False):
+    mode = mode or settings.analytics_mode
+    excluded = analytics.load_stop_words() if stop_words else frozenset()
+    if mode == "incremental":
+        return analytics.get_snapshot(db, k, excluded)
+    if mode == "scan":
+        return _scan_notes(db, k, excluded)
+    if mode == "batch":
+        return _batch_notes(db, k, excluded)
+    raise ValueError(f"Unknown analytics mode: {mode}")
+
 
+def _push_bounded(heap: list, item: tuple, size: int):
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
 
-def analyze_notes(db: Session):
-    notes = crud.get_all_notes(db)
-    if not notes:
+
+def _scan_notes(db: Session, k: int, stop_words: frozenset = frozenset()):
+    """Single streaming pass over ``(id, content)``: each note is tokenized
+    once and only the vocabulary and two k-element heaps are kept in memory."""
+    note_count = 0
+    total_word_count = 0
+    word_frequencies = Counter()
+    longest = []
+    shortest = []
+
+    for note_id, content in crud.iter_note_contents(db, settings.analytics_scan_chunk_size):
+        words = analytics.tokenize(content)
+        length = len(words)
+        note_count += 1
+        total_word_count += length
+        word_frequencies.update(words)
+        _push_bounded(longest, (length, -note_id), k)
+        _push_bounded(shortest, (-length, -note_id), k)
+
+    if not note_count:
         return None
 
-    contents = [note.content for note in notes]
-    word_counts = [len(content.split()) for content in contents]
-    total_word_count = sum(word_counts)
-    avg_note_length = np.mean(word_counts)
-    all_words = " ".join(contents).split()
-    most_common_words = Counter(all_words).most_common(5)
-    sorted_notes = sorted(notes, key=lambda note: len(note.content.split()))
-    top_3_longest = [{"id": note.id, "length": len(note.content.split())} for note in sorted_notes[3:]]
-    top_3_shortest = [{"id": note.id, "length": len(note.content.split())} for note in sorted_notes[:3]]
+    top_3_longest = [{"id": -neg_id, "length": length} for length, neg_id in sorted(longest, reverse=True)]
+    top_3_shortest = [{"id": -neg_id, "length": -neg_length} for neg_length, neg_id in sorted(shortest, reverse=True)]
 
     return {
         "total_word_count": total_word_count,
-        "average_note_length": avg_note_length,
-        "most_common_words": most_common_words,
+        "average_note_length": total_word_count / note_count,
+        "most_common_words": analytics.most_common(word_frequencies, 5, stop_words),
         "top_3_longest_notes": top_3_longest,
         "top_3_shortest_notes": top_3_shortest
-    }
\ No newline at end of file
+    }
+
+
+def _batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _tokenize_batch(contents: tuple):
+    """Tokenize a batch in one pass and return the per-note word-count array
+    and the flattened token list."""
+    token_lists = [content.split() if content else [] for content in contents]
+    word_counts = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+    return word_counts, itertools.chain.from_iterable(token_lists)
+
+
+def _length_distribution(word_counts: np.ndarray):
+    counts, bin_edges = np.histogram(word_counts, bins=settings.analytics_histogram_bins)
+    p50, p90, p99 = np.percentile(word_counts, [50, 90, 99])
+    return {
+        "min": int(word_counts.min()),
+        "max": int(word_counts.max()),
+        "mean": float(word_counts.mean()),
+        "std": float(word_counts.std()),
+        "percentiles": {"p50": float(p50), "p90": float(p90), "p99": float(p99)},
+        "histogram": {"bin_edges": bin_edges.tolist(), "counts": counts.tolist()},
+    }
+
+
+def _batch_notes(db: Session, k: int, stop_words: frozenset = frozenset()):
+    """Batch analytics: notes are tokenized in fixed-size batches and the
+    length statistics (totals, top-k, percentiles, histogram) are computed
+    with NumPy over a compact int64 word-count array.
+
+    Vocabulary counts go through ``Counter.update`` on the flattened batch,
+    which is C-implemented and measured faster than ``np.unique`` on string
+    arrays; stop words are filtered once on the merged vocabulary.
+    """
+    word_frequencies = Counter()
+    id_batches = []
+    count_batches = []
+
+    rows = crud.iter_note_contents(db, settings.analytics_scan_chunk_size)
+    for batch in _batches(rows, settings.analytics_batch_size):
+        ids, contents = zip(*batch)
+        word_counts, tokens = _tokenize_batch(contents)
+        id_batches.append(np.array(ids, dtype=np.int64))
+        count_batches.append(word_counts)
+        word_frequencies.update(tokens)
+
+    if not id_batches:
+        return None
+
+    ids = np.concatenate(id_batches)
+    word_counts = np.concatenate(count_batches)
+    longest = np.lexsort((ids, -word_counts))[:k]
+    shortest = np.lexsort((ids, word_counts))[:k]
+
+    return {
+        "total_word_count": int(word_counts.sum()),
+        "average_note_length": float(word_counts.mean()),
+        "most_common_words": analytics.most_common(word_frequencies, 5, stop_words),
+        "top_3_longest_notes": [{"id": int(ids[i]), "length": int(word_counts[i])} for i in longest],
+        "top_3_shortest_notes": [{"id": int(ids[i]), "length": int(word_counts[i])} for i in shortest],
+        "length_distribution": _length_distribution(word_counts),
+    }
@@ -0,0 +1,271 @@
+"""Near-duplicate detection with MinHash signatures and LSH banding.
+
+Each note's content is reduced to word ``SHINGLE_SIZE``-grams and a
+``NUM_PERM``-value MinHash signature (``note_signatures``); the fraction of
+equal values between two signatures estimates the Jaccard similarity of
+their shingle sets. Signatures are cut into ``BANDS`` bands of ``ROWS``
+values and each band is hashed into ``note_lsh_buckets``: notes sharing a
+bucket in any band are candidates, found by index lookups instead of
+comparing every pair. Pairs above about (1/BANDS)^(1/ROWS) ~ 0.7 similarity
+are almost always candidates.
+
+Kept in sync by the CRUD layer like src/search.py. Changing the
+parameters requires ``python -m src.similarity rebuild``.
+"""
+import hashlib
+import sys
+import zlib
+import numpy as np
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+from src.models import Note, NoteBucket, NoteSignature
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_CHUNK = 2048
+# Buckets with more members than this are verified against their first
+# members only, bounding the report on heavily duplicated content.
+MAX_PAIRWISE_BUCKET = 50
+REBUILD_BATCH_SIZE = 1000
+QUERY_CHUNK_SIZE = 500
+
+_rng = np.random.default_rng(20240601)
+# Multiply-shift hashing: ((a * x + b) mod 2**64) >> 32 with odd ``a``.
+_A = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+
+def shingles(content: str):
+    words = (content or "").lower().split()
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(content: str):
+    """MinHash signature of ``content`` as ``uint32[NUM_PERM]``, or ``None``
+    for content without words."""
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(content)), dtype=np.uint64)
+    if not len(hashes):
+        return None
+    result = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), SHINGLE_CHUNK):
+        chunk = hashes[start:start + SHINGLE_CHUNK, None]
+        np.minimum(result, ((chunk * _A + _B) >> _SHIFT).min(axis=0), out=result)
+    return result.astype(np.uint32)
+
+
+def band_keys(sig):
+    """One signed 64-bit bucket key per band."""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def estimate(sig, others):
+    """Estimated Jaccard similarity of ``sig`` with each row of ``others``."""
+    return (np.asarray(others) == sig).mean(axis=-1)
+
+
+def _decode(data: bytes):
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+def index_note(db: Session, note_id: int, content: str):
+    index_notes(db, [{"id": note_id, "content": content}])
+
+
+def index_notes(db: Session, rows: list):
+    """Add ``{"id", "content"}`` rows to the index (executemany)."""
+    if not rows:
+        return
+    signatures = []
+    buckets = []
+    for row in rows:
+        sig = signature(row["content"])
+        signatures.append({"note_id": row["id"], "signature": None if sig is None else sig.tobytes()})
+        if sig is not None:
+            buckets.extend(
+                {"band": band, "bucket": key, "note_id": row["id"]} for band, key in enumerate(band_keys(sig))
+            )
+    db.execute(insert(NoteSignature), signatures)
+    if buckets:
+        db.execute(insert(NoteBucket), buckets)
+
+
+def unindex_notes(db: Session, note_ids: list):
+    if note_ids:
+        db.execute(delete(NoteBucket).where(NoteBucket.note_id.in_(note_ids)))
+        db.execute(delete(NoteSignature).where(NoteSignature.note_id.in_(note_ids)))
+
+
+def reindex_note(db: Session, note_id: int, content: str):
+    unindex_notes(db, [note_id])
+    index_note(db, note_id, content)
+
+
+def similar_notes(db: Session, note: Note, threshold: float = 0.5, limit: int = 10):
+    """Notes whose estimated similarity to ``note`` is at least
+    ``threshold``, most similar first, as ``{"id", "title", "similarity"}``."""
+    sig = signature(note.content)
+    if sig is None:
+        return []
+    # OR of (band, bucket) equalities rather than a row-value IN, which
+    # SQLite answers with a full scan instead of primary-key lookups.
+    buckets = or_(*(and_(NoteBucket.band == band, NoteBucket.bucket == key) for band, key in enumerate(band_keys(sig))))
+    candidates = db.execute(
+        select(NoteBucket.note_id)
+        .where(buckets)
+        .where(NoteBucket.note_id != note.id)
+        .distinct()
+    ).scalars().all()
+    matches = []
+    for start in range(0, len(candidates), QUERY_CHUNK_SIZE):
+        rows = db.execute(
+            select(Note.id, Note.title, NoteSignature.signature)
+            .join(NoteSignature, NoteSignature.note_id == Note.id)
+            .where(Note.id.in_(candidates[start:start + QUERY_CHUNK_SIZE]))
+        ).all()
+        if not rows:
+            continue
+        scores = estimate(sig, [_decode(row.signature) for row in rows])
+        matches.extend(
+            {"id": row.id, "title": row.title, "similarity": float(score)}
+            for row, score in zip(rows, scores)
+            if score >= threshold
+        )
+    matches.sort(key=lambda match: (-match["similarity"], match["id"]))
+    return matches[:limit]
+
+
+def _candidate_pairs(db: Session):
+    shared = (
+        select(NoteBucket.band, NoteBucket.bucket)
+        .group_by(NoteBucket.band, NoteBucket.bucket)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    rows = db.execute(
+        select(NoteBucket.band, NoteBucket.bucket, NoteBucket.note_id)
+        .join(shared, (NoteBucket.band == shared.c.band) & (NoteBucket.bucket == shared.c.bucket))
+        .order_by(NoteBucket.band, NoteBucket.bucket, NoteBucket.note_id)
+        .execution_options(yield_per=QUERY_CHUNK_SIZE)
+    )
+    pairs = set()
+    group = []
+    current = None
+    for band, bucket, note_id in rows:
+        if (band, bucket) != current:
+            _add_pairs(pairs, group)
+            group = []
+            current = (band, bucket)
+        group.append(note_id)
+    _add_pairs(pairs, group)
+    return pairs
+
+
+def _add_pairs(pairs: set, members: list):
+    anchors = members if len(members) <= MAX_PAIRWISE_BUCKET else members[:1]
+    for i, first in enumerate(anchors):
+        for second in members[i + 1:]:
+            pairs.add((first, second))
+
+
+def _find(parents: dict, node: int):
+    while parents.setdefault(node, node) != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+
+def duplicate_clusters(db: Session, threshold: float = 0.8, min_size: int = 2, limit: int = 50):
+    """Groups of notes linked by pairs with estimated similarity of at least
+    ``threshold``, largest first, as ``{"notes", "size", "min_similarity"}``.
+
+    Only LSH candidate pairs are compared; signatures are loaded for the
+    notes that appear in them.
+    """
+    pairs = _candidate_pairs(db)
+    note_ids = sorted({note_id for pair in pairs for note_id in pair})
+    signatures = {}
+    for start in range(0, len(note_ids), QUERY_CHUNK_SIZE):
+        signatures.update(
+            (note_id, _decode(data))
+            for note_id, data in db.execute(
+                select(NoteSignature.note_id, NoteSignature.signature)
+                .where(NoteSignature.note_id.in_(note_ids[start:start + QUERY_CHUNK_SIZE]))
+            )
+        )
+
+    parents = {}
+    edges = []
+    for first, second in pairs:
+        score = float(estimate(signatures[first], signatures[second]))
+        if score >= threshold:
+            edges.append((first, score))
+            parents[_find(parents, first)] = _find(parents, second)
+    weakest = {}
+    for note_id, score in edges:
+        root = _find(parents, note_id)
+        weakest[root] = min(score, weakest.get(root, 1.0))
+
+    members = {}
+    for note_id in parents:
+        members.setdefault(_find(parents, note_id), []).append(note_id)
+    clusters = sorted(
+        (sorted(ids) for ids in members.values() if len(ids) >= min_size), key=lambda ids: (-len(ids), ids[0])
+    )[:limit]
+    titles = {}
+    cluster_ids = [note_id for ids in clusters for note_id in ids]
+    for start in range(0, len(cluster_ids), QUERY_CHUNK_SIZE):
+        titles.update(db.execute(
+            select(Note.id, Note.title).where(Note.id.in_(cluster_ids[start:start + QUERY_CHUNK_SIZE]))
+        ).all())
+    return [
+        {
+            "notes": [{"id": note_id, "title": titles.get(note_id)} for note_id in ids],
+            "size": len(ids),
+            "min_similarity": weakest[_find(parents, ids[0])],
+        }
+        for ids in clusters
+    ]
+
+
+def ensure_index(db: Session):
+    """Rebuild the index if it does not cover every note, e.g. on a
+    database created before the index existed."""
+    indexed = db.execute(select(func.count()).select_from(NoteSignature)).scalar()
+    notes = db.execute(select(func.count()).select_from(Note)).scalar()
+    if indexed == notes:
+        return False
+    rebuild(db)
+    return True
+
+
+def rebuild(db: Session):
+    """Re-create signatures and buckets for every note, in batches."""
+    db.execute(delete(NoteBucket))
+    db.execute(delete(NoteSignature))
+    rows = db.execute(select(Note.id, Note.content).execution_options(yield_per=REBUILD_BATCH_SIZE))
+    batch = []
+    for note_id, content in rows:
+        batch.append({"id": note_id, "content": content})
+        if len(batch) == REBUILD_BATCH_SIZE:
+            index_notes(db, batch)
+            batch = []
+    index_notes(db, batch)
+    db.commit()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m src.similarity rebuild")
+    from src.database import SessionLocal
+
+    with SessionLocal() as session:
+        rebuild(session)
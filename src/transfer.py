@@ -0,0 +1,291 @@
+"""NDJSON export and import of the notes corpus.
+
+One JSON object per line: ``{"type": "note", ...}`` followed, when
+versions are included, by that note's ``{"type": "version", ...}`` lines
+newest first. Versions carry their reconstructed ``content``, so dumps do
+not depend on the delta format and work across database backends.
+
+Exports stream from server-side cursors and imports commit every
+``IMPORT_BATCH_SIZE`` notes together with an ``ImportCheckpoint``; both run
+in constant memory. Re-sending the same stream with the same ``import_id``
+skips the lines an earlier, interrupted import already committed.
+"""
+import asyncio
+import datetime
+import sys
+import zlib
+import orjson
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from src import analytics, rollups, search, similarity, versions
+from src.config import settings
+from src.database import sync_id_sequence
+from src.models import ImportCheckpoint, Note, NoteVersion
+
+MEDIA_TYPE = "application/x-ndjson"
+GZIP_MAGIC = b"\x1f\x8b"
+EXPORT_CHUNK_BYTES = 64 * 1024
+NOTE_COLUMNS = (Note.id, Note.title, Note.content, Note.revision, Note.created_at, Note.updated_at)
+
+
+class InvalidRecord(ValueError):
+    def __init__(self, line: int, reason: str):
+        super().__init__(f"Line {line}: {reason}")
+        self.line = line
+
+
+def export_records(db: Session, with_versions: bool = False, chunk_size: int = 1000):
+    """Yield export records in note id order.
+
+    Notes and versions are read by two cursors sorted on note id and merged
+    here, so history costs one extra query rather than one per note.
+    """
+    notes = db.execute(select(*NOTE_COLUMNS).order_by(Note.id).execution_options(yield_per=chunk_size))
+    history = iter(())
+    if with_versions:
+        history = db.execute(
+            select(
+                NoteVersion.note_id, NoteVersion.revision, NoteVersion.created_at,
+                NoteVersion.content, NoteVersion.delta, NoteVersion.is_snapshot,
+            )
+            .where(NoteVersion.note_id.is_not(None))
+            .order_by(NoteVersion.note_id, NoteVersion.revision.desc())
+            .execution_options(yield_per=chunk_size)
+        )
+    pending = next(history, None)
+    for note in notes:
+        yield {"type": "note", **note._asdict()}
+        content = note.content
+        while pending is not None and pending.note_id <= note.id:
+            if pending.note_id == note.id:
+                content = versions.version_text(pending, content)
+                yield {
+                    "type": "version",
+                    "note_id": note.id,
+                    "revision": pending.revision,
+                    "created_at": pending.created_at,
+                    "content": content,
+                }
+            pending = next(history, None)
+
+
+def export_chunks(session_factory, with_versions: bool = False, gzip: bool = False):
+    """NDJSON bytes for a streaming response, in ~``EXPORT_CHUNK_BYTES``
+    pieces; the session lives as long as the stream."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    with session_factory() as db:
+        buffer = bytearray()
+        for record in export_records(db, with_versions):
+            buffer += orjson.dumps(record)
+            buffer += b"\n"
+            if len(buffer) >= EXPORT_CHUNK_BYTES:
+                yield compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                buffer.clear()
+    if compressor:
+        yield compressor.compress(bytes(buffer)) + compressor.flush()
+    elif buffer:
+        yield bytes(buffer)
+
+
+def _timestamp(value):
+    if not value:
+        return datetime.datetime.now(datetime.timezone.utc)
+    return rollups.to_utc(datetime.datetime.fromisoformat(value))
+
+
+def _typed(line: int, record: dict, key: str, kind: type, required: bool = False):
+    """``record[key]`` if it is a ``kind`` (or missing/null when not
+    ``required``); raises ``InvalidRecord`` otherwise."""
+    value = record.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, kind) or isinstance(value, bool):
+        expected = "a string" if kind is str else "an integer"
+        raise InvalidRecord(line, f'{record["type"]} "{key}" must be {expected}')
+    return value
+
+
+def parse_record(line: int, raw: bytes):
+    try:
+        record = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        raise InvalidRecord(line, f"invalid JSON ({e})")
+    if not isinstance(record, dict) or record.get("type") not in ("note", "version"):
+        raise InvalidRecord(line, 'expected an object with "type" "note" or "version"')
+    try:
+        if record["type"] == "note":
+            return {
+                "type": "note",
+                "id": _typed(line, record, "id", int),
+                "title": _typed(line, record, "title", str, required=True),
+                "content": _typed(line, record, "content", str) or "",
+                "revision": int(record.get("revision") or 1),
+                "created_at": _timestamp(record.get("created_at")),
+                "updated_at": _timestamp(record.get("updated_at")),
+            }
+        return {
+            "type": "version",
+            "note_id": _typed(line, record, "note_id", int, required=True),
+            "revision": int(record["revision"]),
+            "created_at": _timestamp(record.get("created_at")),
+            "content": _typed(line, record, "content", str) or "",
+        }
+    except InvalidRecord:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidRecord(line, f"malformed {record['type']} ({e})")
+
+
+def get_checkpoint(db: Session, import_id: str):
+    return db.get(ImportCheckpoint, import_id)
+
+
+def import_batch(db: Session, checkpoint: ImportCheckpoint, batch: list, lines: int, keep_ids: bool = True):
+    """Insert one batch of ``(note, [versions])`` records and advance the
+    checkpoint to ``lines`` in the same transaction."""
+    rows = []
+    for note, _ in batch:
+        row = {key: note[key] for key in ("title", "content", "revision", "created_at", "updated_at")}
+        if keep_ids and note["id"] is not None:
+            row["id"] = note["id"]
+        rows.append(row)
+    note_ids = []
+    if rows:
+        word_counts = analytics.record_changes(
+            db, [(None, row["content"]) for row in rows], note_delta=len(rows), rollup=False
+        )
+        for row, word_count in zip(rows, word_counts):
+            row["word_count"] = word_count
+        note_ids = db.execute(insert(Note).returning(Note.id, sort_by_parameter_order=True), rows).scalars().all()
+        if any("id" in row for row in rows):
+            sync_id_sequence(db, Note.__table__)
+        indexed = [
+            {"id": note_id, "title": row["title"], "content": row["content"]} for note_id, row in zip(note_ids, rows)
+        ]
+        search.index_notes(db, indexed)
+        similarity.index_notes(db, indexed)
+
+    history = []
+    for note_id, (note, note_versions) in zip(note_ids, batch):
+        newer = note["content"]
+        for version in note_versions:
+            row = versions.version_row(note_id, version["revision"], version["content"], newer)
+            history.append(dict(row, created_at=version["created_at"]))
+            newer = version["content"]
+    if history:
+        db.execute(insert(NoteVersion), history)
+    # Imported activity counts at its original timestamps.
+    rollups.record_history(
+        db,
+        [(row["created_at"], analytics.tokenize(row["content"])) for row in rows],
+        [row["created_at"] for row in history],
+    )
+
+    checkpoint.lines = lines
+    checkpoint.notes += len(rows)
+    checkpoint.versions += len(history)
+    checkpoint.updated_at = datetime.datetime.now(datetime.timezone.utc)
+    db.commit()
+
+
+def _begin(session_factory, import_id: str):
+    with session_factory() as db:
+        checkpoint = get_checkpoint(db, import_id)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(import_id=import_id, lines=0, notes=0, versions=0)
+            db.add(checkpoint)
+            db.commit()
+        return checkpoint.lines
+
+
+def _commit_batch(session_factory, import_id: str, batch: list, lines: int, keep_ids: bool):
+    with session_factory() as db:
+        import_batch(db, get_checkpoint(db, import_id), batch, lines, keep_ids)
+
+
+def _finish(session_factory, import_id: str, skipped: int):
+    with session_factory() as db:
+        checkpoint = get_checkpoint(db, import_id)
+        return {
+            "import_id": import_id,
+            "lines": checkpoint.lines,
+            "notes": checkpoint.notes,
+            "versions": checkpoint.versions,
+            "skipped_lines": skipped,
+        }
+
+
+async def iter_lines(chunks):
+    """Split an async stream of byte chunks into lines, transparently
+    un-gzipping it when it starts with the gzip magic bytes."""
+    decompressor = None
+    started = False
+    buffer = b""
+    async for chunk in chunks:
+        if not started and chunk:
+            started = True
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if decompressor:
+        buffer += decompressor.flush()
+    if buffer:
+        yield buffer
+
+
+async def import_stream(session_factory, chunks, import_id: str, keep_ids: bool = True, batch_size: int = None):
+    """Import an NDJSON stream, committing every ``batch_size`` notes.
+
+    Batches always end before a note line, so a note and its versions land
+    in the same transaction. Reading pauses while a batch is written, which
+    keeps memory bounded by one batch whatever the upload size.
+    """
+    batch_size = batch_size or settings.import_batch_size
+    done = await asyncio.to_thread(_begin, session_factory, import_id)
+    batch = []
+    lines = 0
+    async for raw in iter_lines(chunks):
+        lines += 1
+        if lines <= done or not raw.strip():
+            continue
+        record = parse_record(lines, raw)
+        if record["type"] == "note":
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(_commit_batch, session_factory, import_id, batch, lines - 1, keep_ids)
+                batch = []
+            batch.append((record, []))
+        elif not batch or batch[-1][0]["id"] != record["note_id"]:
+            raise InvalidRecord(lines, "version does not follow its note")
+        else:
+            batch[-1][1].append(record)
+    if batch or lines > done:
+        await asyncio.to_thread(_commit_batch, session_factory, import_id, batch, max(lines, done), keep_ids)
+    return await asyncio.to_thread(_finish, session_factory, import_id, min(lines, done))
+
+
+async def _read_file(stream):
+    while True:
+        chunk = await asyncio.to_thread(stream.read, EXPORT_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+if __name__ == "__main__":
+    usage = "usage: python -m src.transfer export [--versions] [--gzip] > dump | import IMPORT_ID < dump"
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "import"):
+        sys.exit(usage)
+    from src.database import SessionLocal
+
+    if sys.argv[1] == "export":
+        for chunk in export_chunks(SessionLocal, "--versions" in sys.argv, "--gzip" in sys.argv):
+            sys.stdout.buffer.write(chunk)
+    elif len(sys.argv) == 3:
+        print(asyncio.run(import_stream(SessionLocal, _read_file(sys.stdin.buffer), sys.argv[2])))
+    else:
+        sys.exit(usage)
@@ -0,0 +1,290 @@
+"""Delta-compressed storage for note versions.
+
+Each ``NoteVersion`` row stores its content as a zlib-compressed reverse
+delta against the next newer version (or the note itself, for the newest
+row). Deltas never need rewriting when a note is edited again: the old head
+becomes the newest version and the previous deltas still point at it.
+Every ``VERSION_SNAPSHOT_INTERVAL``-th revision, and any revision whose
+delta would not be smaller, is stored as a compressed full snapshot, so
+reconstructing a version reads at most that many rows.
+"""
+import datetime
+import difflib
+import json
+import re
+import sys
+import zlib
+from sqlalchemy import and_, delete, inspect, or_, select, text, update
+from sqlalchemy.orm import Session
+from src import analytics
+from src.config import settings
+from src.models import Note, NoteVersion
+
+TOKEN = re.compile(r"\S+\s*|\s+")
+MIGRATE_BATCH_SIZE = 100
+# Version rows written before delta storage: full content, no revision.
+LEGACY_ROW = or_(
+    NoteVersion.content.is_not(None), and_(NoteVersion.revision.is_(None), NoteVersion.note_id.is_not(None))
+)
+
+
+def compress(content: str):
+    return zlib.compress((content or "").encode("utf-8"))
+
+
+def decompress(data: bytes):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def encode_delta(base: str, target: str):
+    """Compressed delta that rebuilds ``target`` from ``base``.
+
+    Diffs run over words with their trailing whitespace, so single-paragraph
+    notes diff as well as multi-line ones. Ops are ``[start, end]`` token
+    ranges copied from ``base`` or literal strings.
+    """
+    base_tokens = TOKEN.findall(base or "")
+    target_tokens = TOKEN.findall(target or "")
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_tokens, target_tokens).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_tokens[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"))
+
+
+def apply_delta(base: str, delta: bytes):
+    tokens = TOKEN.findall(base or "")
+    return "".join(
+        op if isinstance(op, str) else "".join(tokens[op[0]:op[1]])
+        for op in json.loads(zlib.decompress(delta))
+    )
+
+
+def version_row(note_id: int, revision: int, old_content: str, new_content: str):
+    """Column values for the version keeping ``old_content`` (revision
+    ``revision``) of a note whose content becomes ``new_content``."""
+    snapshot = compress(old_content)
+    is_snapshot = revision % settings.version_snapshot_interval == 0
+    data = snapshot
+    if not is_snapshot:
+        data = encode_delta(new_content, old_content)
+        if len(data) >= len(snapshot):
+            data, is_snapshot = snapshot, True
+    return {"note_id": note_id, "revision": revision, "delta": data, "is_snapshot": is_snapshot}
+
+
+def _self_contained(version):
+    return version.content is not None or version.is_snapshot
+
+
+def version_text(version, newer_content: str):
+    if version.content is not None:
+        return version.content
+    if version.is_snapshot:
+        return decompress(version.delta)
+    return apply_delta(newer_content, version.delta)
+
+
+def get_version(db: Session, note: Note, revision: int):
+    """``(version, content)`` of ``note`` at ``revision``, or ``None`` if it
+    is not stored.
+
+    Reads forward from ``revision`` to the nearest snapshot, or to the note
+    itself, and applies the reverse deltas back down.
+    """
+    rows = db.execute(
+        select(NoteVersion)
+        .where(NoteVersion.note_id == note.id, NoteVersion.revision >= revision)
+        .order_by(NoteVersion.revision)
+        .execution_options(yield_per=settings.version_snapshot_interval)
+    ).scalars()
+    chain = []
+    for version in rows:
+        chain.append(version)
+        if _self_contained(version):
+            break
+    rows.close()
+    if not chain or chain[0].revision != revision:
+        return None
+    content = note.content
+    for version in reversed(chain):
+        content = version_text(version, content)
+    return chain[0], content
+
+
+def version_content(db: Session, note: Note, revision: int):
+    found = get_version(db, note, revision)
+    return found[1] if found else None
+
+
+def page_contents(db: Session, note: Note, rows: list):
+    """Contents for a newest-first page of version rows (with stored data):
+    the first row is reconstructed, each following consecutive revision
+    costs one delta application."""
+    contents = []
+    for index, row in enumerate(rows):
+        if index and row.revision == rows[index - 1].revision - 1:
+            contents.append(version_text(row, contents[-1]))
+        elif row.content is not None or row.is_snapshot:
+            contents.append(version_text(row, None))
+        else:
+            contents.append(version_content(db, note, row.revision))
+    return contents
+
+
+def history(db: Session, note: Note):
+    """Every stored ``(version, content)`` of ``note``, oldest first,
+    reconstructed in a single newest-to-oldest pass."""
+    rows = db.execute(
+        select(NoteVersion).where(NoteVersion.note_id == note.id).order_by(NoteVersion.revision.desc())
+    ).scalars().all()
+    result = []
+    content = note.content
+    for version in rows:
+        content = version_text(version, content)
+        result.append((version, content))
+    result.reverse()
+    return result
+
+
+# DDL suffixes for columns added to existing tables; ALTER TABLE cannot add a
+# NOT NULL column without a default.
+ADDED_COLUMN_DEFAULTS = {
+    "notes.revision": " NOT NULL DEFAULT 1",
+    "notes.word_count": " NOT NULL DEFAULT 0",
+    "note_versions.is_snapshot": " NOT NULL DEFAULT FALSE",
+}
+
+
+def upgrade_schema(db: Session):
+    """Add the columns and indexes of ``notes`` and ``note_versions`` that
+    an older database lacks; ``create_all`` only creates missing tables.
+
+    Run by ``init_db``. A new ``word_count`` column is backfilled through
+    ``analytics.rebuild``, as are NULL counts left by older versions of this
+    function. Returns the added columns as ``table.column``.
+    """
+    bind = db.get_bind()
+    inspector = inspect(bind)
+    added = []
+    for table in (Note.__table__, NoteVersion.__table__):
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            name = f"{table.name}.{column.name}"
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"
+            db.execute(text(ddl + ADDED_COLUMN_DEFAULTS.get(name, "")))
+            added.append(name)
+    for index in (*Note.__table__.indexes, *NoteVersion.__table__.indexes):
+        index.create(bind=db.connection(), checkfirst=True)
+    db.commit()
+    if "notes.word_count" in added or db.execute(select(Note.id).where(Note.word_count.is_(None)).limit(1)).first():
+        analytics.rebuild(db)
+    return added
+
+
+def _migrate_note(db: Session, note: Note):
+    # Renumber in write order: only snapshot placement depends on the
+    # numbers, and rows written by this module after the upgrade but before
+    # the migration started their numbering at 1 too.
+    rows = db.execute(
+        select(NoteVersion).where(NoteVersion.note_id == note.id).order_by(NoteVersion.id)
+    ).scalars().all()
+    content = note.content
+    for revision, version in reversed(list(enumerate(rows, start=1))):
+        old_content = version_text(version, content)
+        if version.content is not None or version.revision != revision:
+            for key, value in version_row(note.id, revision, old_content, content).items():
+                setattr(version, key, value)
+            version.content = None
+        content = old_content
+    note.revision = len(rows) + 1
+
+
+def migrate(db: Session):
+    """Add the delta storage columns and convert full-content version rows.
+
+    Commits after every ``MIGRATE_BATCH_SIZE`` notes so write locks stay
+    short. Versions of deleted notes become plain snapshots.
+    """
+    upgrade_schema(db)
+    note_ids = db.execute(
+        select(NoteVersion.note_id).where(LEGACY_ROW, NoteVersion.note_id.is_not(None)).distinct()
+    ).scalars().all()
+    for start in range(0, len(note_ids), MIGRATE_BATCH_SIZE):
+        notes = db.execute(select(Note).where(Note.id.in_(note_ids[start:start + MIGRATE_BATCH_SIZE]))).scalars().all()
+        for note in notes:
+            _migrate_note(db, note)
+        db.commit()
+
+    orphans = db.execute(
+        select(NoteVersion.id, NoteVersion.content)
+        .where(NoteVersion.content.is_not(None), NoteVersion.note_id.is_(None))
+    ).all()
+    for start in range(0, len(orphans), MIGRATE_BATCH_SIZE):
+        db.execute(
+            update(NoteVersion),
+            [
+                {"id": version_id, "content": None, "delta": compress(content), "is_snapshot": True}
+                for version_id, content in orphans[start:start + MIGRATE_BATCH_SIZE]
+            ],
+        )
+        db.commit()
+    return {"notes": len(note_ids), "orphaned_versions": len(orphans)}
+
+
+def ensure_migrated(db: Session):
+    """Run ``migrate`` if legacy version rows are left, e.g. on a database
+    upgraded in place; the versions API needs their revision numbers."""
+    if db.execute(select(NoteVersion.id).where(LEGACY_ROW).limit(1)).first() is None:
+        return False
+    migrate(db)
+    return True
+
+
+def _delete_batches(db: Session, condition):
+    deleted = 0
+    while True:
+        ids = db.execute(
+            select(NoteVersion.id).where(condition).limit(settings.version_prune_batch_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        db.execute(delete(NoteVersion).where(NoteVersion.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+
+def prune(db: Session, keep_max: int = None, keep_days: float = None):
+    """Apply the retention policy: drop versions of deleted notes, versions
+    older than ``keep_days`` and all but the newest ``keep_max`` versions of
+    each note (0 disables either limit).
+
+    Only the oldest versions of a note are ever removed, so the remaining
+    deltas stay resolvable. Deletes run in ``VERSION_PRUNE_BATCH_SIZE``
+    batches, each in its own short transaction.
+    """
+    keep_max = settings.version_keep_max if keep_max is None else keep_max
+    keep_days = settings.version_keep_days if keep_days is None else keep_days
+    result = {"orphaned": _delete_batches(db, NoteVersion.note_id.is_(None)), "expired": 0, "excess": 0}
+    if keep_days:
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=keep_days)
+        result["expired"] = _delete_batches(db, NoteVersion.created_at < cutoff)
+    if keep_max:
+        oldest_kept = select(Note.revision - keep_max).where(Note.id == NoteVersion.note_id).scalar_subquery()
+        result["excess"] = _delete_batches(db, NoteVersion.revision < oldest_kept)
+    return result
+
+
+COMMANDS = {"migrate": migrate, "prune": prune}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in COMMANDS:
+        sys.exit("usage: python -m src.versions {migrate|prune}")
+    from src.database import SessionLocal
+
+    with SessionLocal() as session:
+        print(COMMANDS[sys.argv[1]](session))
@@ -1,12 +1,23 @@
+import asyncio
+import datetime
 import pytest
-from sqlalchemy import create_engine
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, insert
 from sqlalchemy.orm import sessionmaker
-from src.models import Base
-from src.crud import create_note, get_note, update_note, delete_note, get_all_notes
+from sqlalchemy.pool import StaticPool
+from app_init import create_app
+from src import analytics, crud, note_cache, search, services, versions
+from src.config import settings
+from src.database import create_async_db_engine, create_db_engine, get_async_db, get_db, get_session_factory
+from src.llm import FakeModel
+from src.chunking import split_text
+from src.models import Base, Note, NoteVersion, WordFrequency, AnalyticsTotals, CachedSummary, ChunkSummary
+from src.crud import create_note, get_note, update_note, delete_note, get_all_notes, iter_note_contents
 from src.services import analyze_notes
 
 db_url = "sqlite:///:memory:"
-engine = create_engine(db_url, connect_args={"check_same_thread": False})
+engine = create_engine(db_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture(scope="function")
@@ -52,3 +63,942 @@ def test_analyze_notes(db_session):
     stats = analyze_notes(db_session)
     assert stats["total_word_count"] > 0
     assert len(stats["most_common_words"]) > 0
+
+def test_incremental_analytics_tracks_writes(db_session):
+    first = create_note(db_session, "Note 1", "This is a sample note.")
+    second = create_note(db_session, "Note 2", "Another example note content.")
+    create_note(db_session, "Note 3", "note note")
+    update_note(db_session, first.id, "Rewritten sample")
+    delete_note(db_session, second.id)
+
+    incremental = analyze_notes(db_session, mode="incremental")
+    scan = analyze_notes(db_session, mode="scan")
+    assert incremental["total_word_count"] == scan["total_word_count"] == 4
+    assert incremental["average_note_length"] == scan["average_note_length"]
+    assert incremental["most_common_words"][0] == ("note", 2)
+    assert dict(incremental["most_common_words"]) == dict(scan["most_common_words"])
+    assert db_session.get(WordFrequency, "content") is None
+
+def test_analytics_rebuild_repairs_drift(db_session):
+    create_note(db_session, "Note 1", "one two two")
+    create_note(db_session, "Note 2", "three")
+    db_session.execute(delete(WordFrequency))
+    db_session.execute(delete(AnalyticsTotals))
+    db_session.commit()
+    assert analyze_notes(db_session, mode="incremental") is None
+
+    result = analytics.rebuild(db_session)
+
+    assert result["notes"] == 2
+    stats = analyze_notes(db_session, mode="incremental")
+    assert stats["total_word_count"] == 4
+    assert stats["most_common_words"][0] == ("two", 2)
+    assert stats["top_3_longest_notes"][0]["length"] == 3
+
+def test_iter_note_contents_projects_columns(db_session):
+    note = create_note(db_session, "Title", "Some content")
+    db_session.expunge_all()
+
+    rows = list(iter_note_contents(db_session, chunk_size=1))
+
+    assert rows == [(note.id, "Some content")]
+    assert len(db_session.identity_map) == 0
+
+@pytest.fixture(scope="function")
+def client(db_session):
+    note_cache.configure()
+    app = create_app()
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+@pytest.mark.parametrize("mode", ["incremental", "scan"])
+def test_analyze_notes_top_k(db_session, mode):
+    for words in ("a", "a b c d", "a b", "a b c", "a b c d e"):
+        create_note(db_session, "Note", words)
+
+    stats = analyze_notes(db_session, mode=mode, k=2)
+
+    assert [note["length"] for note in stats["top_3_longest_notes"]] == [5, 4]
+    assert [note["length"] for note in stats["top_3_shortest_notes"]] == [1, 2]
+
+def test_analytics_endpoint_k_param(client, db_session):
+    for words in ("a", "a b", "a b c", "a b c d"):
+        create_note(db_session, "Note", words)
+
+    response = client.get("/analytics/", params={"k": 1})
+
+    assert response.status_code == 200
+    assert response.json()["top_3_longest_notes"] == [{"id": 4, "length": 4}]
+    assert client.get("/analytics/", params={"k": 0}).status_code == 422
+
+def test_batch_analytics_matches_scan(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "analytics_batch_size", 2)
+    for words in ("the cat sat", "the dog", "a cat and the dog ran", "cat"):
+        create_note(db_session, "Note", words)
+
+    batch = analyze_notes(db_session, mode="batch")
+    scan = analyze_notes(db_session, mode="scan")
+
+    assert batch["total_word_count"] == scan["total_word_count"] == 12
+    assert batch["average_note_length"] == scan["average_note_length"]
+    assert dict(batch["most_common_words"]) == dict(scan["most_common_words"])
+    assert batch["top_3_longest_notes"] == scan["top_3_longest_notes"]
+    assert batch["top_3_shortest_notes"] == scan["top_3_shortest_notes"]
+    distribution = batch["length_distribution"]
+    assert (distribution["min"], distribution["max"]) == (1, 6)
+    assert sum(distribution["histogram"]["counts"]) == 4
+
+@pytest.mark.parametrize("mode", ["incremental", "scan", "batch"])
+def test_analytics_stop_words(db_session, monkeypatch, mode):
+    monkeypatch.setattr(analytics, "load_stop_words", lambda: frozenset({"the", "a"}))
+    create_note(db_session, "Note", "The cat and the dog")
+    create_note(db_session, "Note", "a cat")
+
+    stats = analyze_notes(db_session, mode=mode, stop_words=True)
+
+    words = dict(stats["most_common_words"])
+    assert "the" not in words and "The" not in words and "a" not in words
+    assert words["cat"] == 2
+
+def test_analytics_endpoint_without_stop_word_corpus(client, db_session, monkeypatch):
+    def missing_corpus():
+        raise LookupError("stopwords")
+    monkeypatch.setattr(analytics, "load_stop_words", missing_corpus)
+    create_note(db_session, "Note", "text")
+
+    response = client.get("/analytics/", params={"stop_words": True})
+
+    assert response.status_code == 503
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    model = MagicMock(spec=["generate_content"])
+    model.generate_content.side_effect = lambda prompt: MagicMock(text=f"summary of {len(prompt)}")
+    monkeypatch.setattr(services, "get_gemini_model", lambda: model)
+    services.summary_cache.clear()
+    services.summary_counters.clear()
+    return model
+
+def summarize(note_id):
+    return asyncio.run(services.summarize_note_async(note_id, TestingSessionLocal))
+
+def test_summary_cache_hits_skip_model(db_session, fake_model):
+    note = create_note(db_session, "Title", "Long note content")
+
+    first = summarize(note.id)
+    second = summarize(note.id)
+    services.summary_cache.clear()
+    third = summarize(note.id)
+
+    assert first == second == third
+    assert fake_model.generate_content.call_count == 1
+    stats = services.summary_cache_stats()
+    assert (stats["misses"], stats["memory_hits"], stats["store_hits"]) == (1, 1, 1)
+
+def test_summary_cache_invalidated_by_update(db_session, fake_model):
+    note = create_note(db_session, "Title", "Original content")
+    summarize(note.id)
+
+    update_note(db_session, note.id, "Edited content that is longer")
+    summary = summarize(note.id)
+
+    assert fake_model.generate_content.call_count == 2
+    assert "Edited" in fake_model.generate_content.call_args[0][0]
+    assert summary == db_session.query(CachedSummary).one().summary
+
+def test_summarize_endpoint_uses_async_model(client, db_session, monkeypatch):
+    model = FakeModel(latency=0.01)
+    monkeypatch.setattr(services, "get_gemini_model", lambda: model)
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    services.summary_cache.clear()
+    note = create_note(db_session, "Title", "Some words worth summarizing")
+
+    response = client.post(f"/notes/{note.id}/summarize")
+    cached = client.post(f"/notes/{note.id}/summarize")
+
+    assert response.status_code == 200
+    assert response.json() == {"id": note.id, "summary": "Summarize the following note: Some words worth summarizing"}
+    assert cached.json() == response.json()
+    assert model.calls == 1
+    assert client.post("/notes/999/summarize").status_code == 404
+
+def test_batch_summary_job_packs_short_notes(client, db_session, monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(services, "get_gemini_model", lambda: model)
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    services.summary_cache.clear()
+    notes = [create_note(db_session, f"Batch {i}", f"short note number {i}") for i in range(5)]
+    cached = notes[0]
+    summarize(cached.id)
+    model.calls = 0
+
+    response = client.post("/notes/summarize:batch", json={"ids": [note.id for note in notes] + [999]})
+
+    assert response.status_code == 202
+    job = client.get(f"/jobs/{response.json()['id']}").json()
+    assert job["status"] == "completed"
+    assert (job["total"], job["completed"], job["failed"]) == (6, 5, 1)
+    results = {result["id"]: result for result in job["results"]}
+    assert results[notes[3].id]["summary"] == "short note number 3"
+    assert results[999]["error"] == "Note not found"
+    assert model.calls == 1
+    assert db_session.query(CachedSummary).count() == 5
+
+def test_batch_summary_job_by_title_filter(client, db_session, monkeypatch):
+    monkeypatch.setattr(services, "get_gemini_model", lambda: FakeModel())
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    create_note(db_session, "weekly report", "numbers went up")
+    create_note(db_session, "shopping", "milk eggs")
+
+    response = client.post("/notes/summarize:batch", json={"title_contains": "report"})
+
+    assert response.json()["total"] == 1
+    assert client.post("/notes/summarize:batch", json={}).status_code == 422
+    assert client.get("/jobs/unknown").status_code == 404
+
+def test_long_note_map_reduce_reuses_unchanged_chunks(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "summary_chunk_chars", 200)
+    model = FakeModel()
+    services.summary_cache.clear()
+    paragraphs = [f"Section {i} " + " ".join(f"w{i}x{j}" for j in range(20)) for i in range(8)]
+    note = create_note(db_session, "Long", "\n\n".join(paragraphs))
+
+    asyncio.run(services.summarize_content(model, note.content, TestingSessionLocal))
+    first_calls = model.calls
+    chunks = split_text(note.content, 200)
+    assert len(chunks) > 2
+    assert first_calls >= len(chunks) + 1
+
+    paragraphs[-1] += " edited"
+    model.calls = 0
+    summary = asyncio.run(services.summarize_content(model, "\n\n".join(paragraphs), TestingSessionLocal))
+
+    assert summary
+    assert model.calls < first_calls
+    assert db_session.query(ChunkSummary).count() >= len(chunks)
+
+def test_search_endpoint_ranks_and_tracks_writes(client, db_session):
+    title_hit = create_note(db_session, "Gardening tips", "Water the plants daily.")
+    content_hit = create_note(db_session, "Misc", "Some thoughts about gardening and cooking.")
+    other = create_note(db_session, "Cooking", "Pasta recipe.")
+
+    response = client.get("/notes/search", params={"q": "gardening"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [hit["id"] for hit in body["items"]] == [title_hit.id, content_hit.id]
+    assert "[gardening]" in body["items"][1]["snippet"]
+    assert body["has_more"] is False
+
+    update_note(db_session, other.id, "Gardening in pots")
+    delete_note(db_session, content_hit.id)
+    ids = [hit["id"] for hit in client.get("/notes/search", params={"q": "gardening"}).json()["items"]]
+    assert sorted(ids) == sorted([title_hit.id, other.id])
+    assert client.get("/notes/search", params={"q": "pasta"}).json()["items"] == []
+
+def test_search_pagination_and_syntax_safety(client, db_session):
+    for i in range(3):
+        create_note(db_session, f"Note {i}", "shared term")
+
+    page = client.get("/notes/search", params={"q": "shared", "limit": 2}).json()
+    rest = client.get("/notes/search", params={"q": "shared", "limit": 2, "offset": 2}).json()
+
+    assert (len(page["items"]), page["has_more"]) == (2, True)
+    assert (len(rest["items"]), rest["has_more"]) == (1, False)
+    assert client.get("/notes/search", params={"q": 'shared" OR NEAR('}).status_code == 200
+
+def test_search_fallback_without_fts(db_session, monkeypatch):
+    create_note(db_session, "Alpha", "first note about Search engines")
+    monkeypatch.setattr(search, "uses_fts", lambda db: False)
+    create_note(db_session, "Beta", "second note")
+
+    hits = search.search_notes(db_session, "search")
+
+    assert [hit["title"] for hit in hits] == ["Alpha"]
+    assert hits[0]["snippet"].startswith("Search engines")
+
+def test_list_notes_keyset_pagination(client, db_session):
+    notes = [create_note(db_session, f"Note {i}", f"content {i}") for i in range(5)]
+
+    first = client.get("/notes/", params={"limit": 2}).json()
+    second = client.get("/notes/", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    update_note(db_session, notes[0].id, "edited")
+    third = client.get("/notes/", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+
+    assert [item["id"] for item in first["items"]] == [notes[0].id, notes[1].id]
+    assert [item["id"] for item in second["items"]] == [notes[2].id, notes[3].id]
+    assert [item["id"] for item in third["items"]] == [notes[4].id, notes[0].id]
+    assert third["items"][1]["content"] == "edited"
+
+def test_list_notes_projection_and_etag(client, db_session):
+    note = create_note(db_session, "Title", "Body")
+
+    response = client.get("/notes/", params={"fields": "title"})
+    assert response.json()["items"] == [
+        {"id": note.id, "title": "Title", "updated_at": response.json()["items"][0]["updated_at"]}
+    ]
+    assert response.json()["next_cursor"] is None
+
+    etag = response.headers["ETag"]
+    cached = client.get("/notes/", params={"fields": "title"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    update_note(db_session, note.id, "Changed")
+    assert client.get("/notes/", params={"fields": "title"}, headers={"If-None-Match": etag}).status_code == 200
+
+    assert client.get("/notes/", params={"fields": "secret"}).status_code == 422
+    assert client.get("/notes/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_bulk_revision_only_update_refreshes_etags(client, db_session):
+    note = create_note(db_session, "Title", "Body")
+    listed = client.get("/notes/")
+    assert client.get(f"/notes/{note.id}").headers["ETag"] == '"1"'
+
+    response = client.post("/notes:bulk", json={"operations": [{"op": "update", "id": note.id, "content": "Body"}]})
+    assert response.status_code == 200
+
+    relisted = client.get("/notes/", headers={"If-None-Match": listed.headers["ETag"]})
+    assert relisted.status_code == 200 and relisted.json()["items"][0]["revision"] == 2
+    assert client.get(f"/notes/{note.id}").headers["ETag"] == '"2"'
+
+def test_bulk_operations_single_transaction(client, db_session):
+    existing = create_note(db_session, "Existing", "old words here")
+    doomed = create_note(db_session, "Doomed", "goodbye words")
+
+    response = client.post("/notes:bulk", json={"operations": [
+        {"op": "create", "title": "New 1", "content": "fresh words"},
+        {"op": "update", "id": existing.id, "content": "new words"},
+        {"op": "update", "id": existing.id, "content": "newest words here now"},
+        {"op": "delete", "id": doomed.id},
+        {"op": "delete", "id": 999},
+        {"op": "create", "title": "New 2", "content": "more"},
+    ]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "updated", "updated", "deleted", "not_found", "created"]
+    db_session.expire_all()
+    created = get_note(db_session, results[0]["id"])
+    assert (created.title, created.word_count) == ("New 1", 2)
+    updated = get_note(db_session, existing.id)
+    assert (updated.content, updated.word_count) == ("newest words here now", 4)
+    assert [content for _, content in versions.history(db_session, updated)] == ["old words here", "new words"]
+    assert get_note(db_session, doomed.id) is None
+
+    scan = analyze_notes(db_session, mode="scan")
+    incremental = analyze_notes(db_session, mode="incremental")
+    assert incremental["total_word_count"] == scan["total_word_count"] == 7
+    assert incremental["most_common_words"][0] == scan["most_common_words"][0] == ("words", 2)
+    assert [hit["id"] for hit in search.search_notes(db_session, "newest")] == [existing.id]
+    assert search.search_notes(db_session, "goodbye") == []
+    assert search.search_notes(db_session, "old") == []
+
+def test_bulk_rejects_invalid_operations(client):
+    assert client.post("/notes:bulk", json={"operations": []}).status_code == 422
+    assert client.post("/notes:bulk", json={"operations": [{"op": "rename", "id": 1}]}).status_code == 422
+
+def test_tuned_sqlite_engine_applies_pragmas(tmp_path):
+    tuned = create_db_engine(f"sqlite:///{tmp_path / 'tuned.db'}", profile="tuned")
+    plain = create_db_engine(f"sqlite:///{tmp_path / 'plain.db'}", profile="default")
+
+    with tuned.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == settings.sqlite_busy_timeout_ms
+    with plain.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+    assert tuned.pool.size() == settings.db_pool_size
+    tuned.dispose()
+    plain.dispose()
+
+def test_tuned_memory_engine_shares_one_connection():
+    memory = create_db_engine("sqlite:///:memory:", profile="tuned")
+    Base.metadata.create_all(memory)
+    Session = sessionmaker(bind=memory)
+
+    with Session() as db:
+        create_note(db, "Title", "Content")
+    with Session() as db:
+        assert len(get_all_notes(db)) == 1
+
+def test_fallback_search_matches_wildcards_literally(db_session):
+    match = create_note(db_session, "Growth", "Up 100% on A_B tests")
+    create_note(db_session, "Other", "Up 1000 on AxB tests")
+
+    assert [hit["id"] for hit in search._fallback_search(db_session, "100%", 10, 0)] == [match.id]
+    assert [hit["id"] for hit in search._fallback_search(db_session, "a_b", 10, 0)] == [match.id]
+    assert [hit["id"] for hit in search._fallback_search(db_session, "GROWTH", 10, 0)] == [match.id]
+
+def test_search_ensure_index_backfills_existing_notes(db_session):
+    db_session.execute(insert(Note), [{"title": "Legacy", "content": "written before the index"}])
+    db_session.commit()
+    assert search.search_notes(db_session, "legacy") == []
+
+    assert search.ensure_index(db_session) is True
+
+    legacy = search.search_notes(db_session, "legacy")
+    assert [hit["title"] for hit in legacy] == ["Legacy"]
+    update_note(db_session, legacy[0]["id"], "rewritten")
+    assert search.ensure_index(db_session) is False
+
+def test_async_crud_routes(tmp_path, monkeypatch):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}", profile="tuned")
+
+    async def create_tables():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    monkeypatch.setattr(settings, "db_async", True)
+    note_cache.configure()
+    app = create_app()
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    client = TestClient(app)
+
+    created = client.post("/notes/", json={"title": "Async", "content": "awaited write"}).json()
+    assert client.get(f"/notes/{created['id']}").json()["content"] == "awaited write"
+    assert client.put(f"/notes/{created['id']}", json={"content": "awaited rewrite"}).status_code == 200
+    assert [hit["id"] for hit in client.get("/notes/search", params={"q": "rewrite"}).json()["items"]] == [created["id"]]
+    bulk = client.post("/notes:bulk", json={"operations": [{"op": "create", "title": "B", "content": "bulk"}]})
+    assert bulk.status_code == 200
+    assert len(client.get("/notes/").json()["items"]) == 2
+    assert client.delete(f"/notes/{created['id']}").status_code == 200
+    assert client.get(f"/notes/{created['id']}").status_code == 404
+    asyncio.run(async_engine.dispose())
+
+def test_read_cache_serves_bytes_and_invalidates_on_write(client, db_session):
+    note = create_note(db_session, "Cached", "first")
+    first = client.get(f"/notes/{note.id}")
+    second = client.get(f"/notes/{note.id}")
+    assert first.content == second.content
+    assert note_cache.stats()["hits"] == 1
+
+    client.put(f"/notes/{note.id}", json={"content": "second"})
+    assert client.get(f"/notes/{note.id}").json()["content"] == "second"
+    client.post("/notes:bulk", json={"operations": [{"op": "update", "id": note.id, "content": "third"}]})
+    assert client.get(f"/notes/{note.id}").json()["content"] == "third"
+    client.delete(f"/notes/{note.id}")
+    assert client.get(f"/notes/{note.id}").status_code == 404
+    assert note_cache.stats()["hit_ratio"] == 1 / 5
+
+def test_read_cache_rejects_fill_that_raced_a_write(client, db_session):
+    note = create_note(db_session, "Cached", "first")
+    token = note_cache.generation(note.id)
+    stale = b'{"content": "first"}'
+    update_note(db_session, note.id, "second")
+
+    assert note_cache.put(note.id, 1, stale, token) is False
+    assert client.get(f"/notes/{note.id}").json()["content"] == "second"
+    assert client.get(f"/notes/{note.id}").json()["content"] == "second"
+    assert note_cache.stats()["hits"] == 1
+
+def test_versions_reconstruct_across_snapshots(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "version_snapshot_interval", 4)
+    base = " ".join(f"word{i}" for i in range(200))
+    note = create_note(db_session, "Versioned", base)
+    contents = [base]
+    for edit in range(1, 10):
+        contents.append(f"{contents[-1]} edit{edit}")
+        update_note(db_session, note.id, contents[-1])
+
+    assert note.revision == 10
+    stored = db_session.query(NoteVersion).filter_by(note_id=note.id).order_by(NoteVersion.revision).all()
+    assert [version.revision for version in stored if version.is_snapshot] == [4, 8]
+    assert all(version.content is None for version in stored)
+    for revision in range(1, 10):
+        assert versions.version_content(db_session, note, revision) == contents[revision - 1]
+    assert [content for _, content in versions.history(db_session, note)] == contents[:-1]
+
+def test_upgrade_schema_adds_and_backfills_columns():
+    from sqlalchemy import text
+
+    legacy = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with legacy.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, title VARCHAR, content TEXT, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE note_versions (id INTEGER PRIMARY KEY, note_id INTEGER, content TEXT, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO notes (title, content) VALUES ('Old', 'one two three'), ('Older', 'four')"))
+    Base.metadata.create_all(legacy)
+    with sessionmaker(bind=legacy)() as db:
+        assert set(versions.upgrade_schema(db)) >= {"notes.word_count", "notes.revision", "note_versions.is_snapshot"}
+        assert versions.upgrade_schema(db) == []
+        assert [(note.word_count, note.revision) for note in get_all_notes(db)] == [(3, 1), (1, 1)]
+        assert analytics.get_snapshot(db)["total_word_count"] == 4
+        search.ensure_index(db)
+        update_note(db, 1, "one two")
+        assert get_note(db, 1).word_count == 2
+    legacy.dispose()
+
+def test_ensure_migrated_serves_legacy_versions_after_upgrade():
+    from sqlalchemy import text
+
+    legacy = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with legacy.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, title VARCHAR, content TEXT, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE note_versions (id INTEGER PRIMARY KEY, note_id INTEGER, content TEXT, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO notes (title, content, created_at) VALUES ('Old', 'second', '2024-01-01 00:00:00')"))
+        conn.execute(text("INSERT INTO note_versions (note_id, content, created_at) VALUES (1, 'first', '2024-01-01 00:00:00')"))
+    Base.metadata.create_all(legacy)
+    Legacy = sessionmaker(bind=legacy, autoflush=False)
+    with Legacy() as db:
+        versions.upgrade_schema(db)
+        assert versions.ensure_migrated(db) is True
+        assert versions.ensure_migrated(db) is False
+        search.ensure_index(db)
+    target = _target_client(Legacy)
+
+    assert target.put("/notes/1", json={"content": "third"}).status_code == 200
+    for params in ({}, {"content": "true"}):
+        response = target.get("/notes/1/versions", params=params)
+        assert response.status_code == 200
+        assert [item["revision"] for item in response.json()["items"]] == [2, 1]
+    items = target.get("/notes/1/versions", params={"content": "true"}).json()["items"]
+    assert [item["content"] for item in items] == ["second", "first"]
+    legacy.dispose()
+
+def test_versions_migrate_legacy_rows(db_session):
+    note = create_note(db_session, "Legacy", "third")
+    doomed = create_note(db_session, "Doomed", "gone")
+    db_session.add_all([
+        NoteVersion(note_id=note.id, content="first"),
+        NoteVersion(note_id=note.id, content="second"),
+        NoteVersion(note_id=None, content="orphan"),
+    ])
+    db_session.commit()
+
+    assert versions.migrate(db_session) == {"notes": 1, "orphaned_versions": 1}
+
+    assert note.revision == 3
+    assert db_session.query(NoteVersion).filter(NoteVersion.content.is_not(None)).count() == 0
+    assert [versions.version_content(db_session, note, revision) for revision in (1, 2)] == ["first", "second"]
+    update_note(db_session, note.id, "fourth")
+    assert [content for _, content in versions.history(db_session, note)] == ["first", "second", "third"]
+    assert get_note(db_session, doomed.id).revision == 1
+
+def test_versions_api_pages_metadata_and_content(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "version_snapshot_interval", 3)
+    note = create_note(db_session, "History", "rev 1")
+    for revision in range(2, 8):
+        update_note(db_session, note.id, f"rev {revision}")
+
+    first = client.get(f"/notes/{note.id}/versions", params={"limit": 4}).json()
+    assert [item["revision"] for item in first["items"]] == [6, 5, 4, 3]
+    assert all(item["content"] is None and item["size"] > 0 for item in first["items"])
+    second = client.get(f"/notes/{note.id}/versions", params={"limit": 4, "cursor": first["next_cursor"]}).json()
+    assert [item["revision"] for item in second["items"]] == [2, 1]
+    assert second["next_cursor"] is None
+
+    with_content = client.get(f"/notes/{note.id}/versions", params={"content": "true"}).json()
+    assert [item["content"] for item in with_content["items"]] == [f"rev {revision}" for revision in range(6, 0, -1)]
+    assert client.get(f"/notes/{note.id}/versions/2").json()["content"] == "rev 2"
+    assert client.get(f"/notes/{note.id}/versions/7").status_code == 404
+    assert client.get("/notes/999/versions").status_code == 404
+
+def test_versions_api_time_window_accepts_offsets(client, db_session):
+    note = create_note(db_session, "Windowed", "rev 1")
+    for revision in range(2, 5):
+        update_note(db_session, note.id, f"rev {revision}")
+    db_session.query(NoteVersion).filter_by(revision=2).update({"created_at": datetime.datetime(2024, 1, 1, 10, 30)})
+    db_session.commit()
+
+    params = {"since": "2024-01-01T12:00:00+02:00", "until": "2024-01-01T13:00:00+02:00"}
+    window = client.get(f"/notes/{note.id}/versions", params=params).json()
+    assert [item["revision"] for item in window["items"]] == [2]
+    naive = client.get(f"/notes/{note.id}/versions", params={"since": "2024-01-01T12:00:00"}).json()
+    assert 2 not in [item["revision"] for item in naive["items"]]
+
+def test_versions_prune_keeps_newest_and_drops_orphans(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "version_prune_batch_size", 2)
+    note = create_note(db_session, "Kept", "rev 1")
+    doomed = create_note(db_session, "Doomed", "rev 1")
+    for revision in range(2, 8):
+        update_note(db_session, note.id, f"rev {revision}")
+    update_note(db_session, doomed.id, "rev 2")
+    delete_note(db_session, doomed.id)
+
+    assert versions.prune(db_session, keep_max=3) == {"orphaned": 1, "expired": 0, "excess": 3}
+    assert [version.revision for version, _ in versions.history(db_session, note)] == [4, 5, 6]
+    assert [content for _, content in versions.history(db_session, note)] == ["rev 4", "rev 5", "rev 6"]
+
+def test_update_if_match_revision(client, db_session):
+    note = create_note(db_session, "Guarded", "v1")
+    assert client.get(f"/notes/{note.id}").headers["ETag"] == '"1"'
+
+    updated = client.put(f"/notes/{note.id}", json={"content": "v2"}, headers={"If-Match": '"1"'})
+    assert (updated.status_code, updated.headers["ETag"], updated.json()["revision"]) == (200, '"2"', 2)
+    stale = client.put(f"/notes/{note.id}", json={"content": "lost"}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 412
+    assert client.put(f"/notes/{note.id}", json={"content": "x"}, headers={"If-Match": "bogus"}).status_code == 412
+    assert client.put(f"/notes/{note.id}", json={"content": "v3"}, headers={"If-Match": "*"}).status_code == 200
+    assert client.get(f"/notes/{note.id}").json()["content"] == "v3"
+
+def test_concurrent_update_conflicts_instead_of_losing_write(tmp_path):
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'occ.db'}")
+    Base.metadata.create_all(file_engine)
+    Session = sessionmaker(bind=file_engine, autoflush=False)
+    with Session() as setup:
+        note_id = create_note(setup, "Contended", "original").id
+
+    with Session() as first, Session() as second:
+        loaded = first.get(Note, note_id)
+        assert loaded.revision == 1
+        update_note(second, note_id, "second writer")
+        with pytest.raises(crud.RevisionConflict):
+            update_note(first, note_id, "first writer", expected_revision=1)
+
+    with Session() as check:
+        note = get_note(check, note_id)
+        assert (note.content, note.revision) == ("second writer", 2)
+        assert [content for _, content in versions.history(check, note)] == ["original"]
+    file_engine.dispose()
+
+def test_concurrent_unguarded_update_retries_on_fresh_row(tmp_path):
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'occ.db'}")
+    Base.metadata.create_all(file_engine)
+    Session = sessionmaker(bind=file_engine, autoflush=False)
+    with Session() as setup:
+        note_id = create_note(setup, "Contended", "original").id
+
+    with Session() as first, Session() as second:
+        assert first.get(Note, note_id).revision == 1
+        update_note(second, note_id, "second writer")
+        note = update_note(first, note_id, "first writer")
+        assert (note.content, note.revision) == ("first writer", 3)
+
+    with Session() as check:
+        note = get_note(check, note_id)
+        assert [content for _, content in versions.history(check, note)] == ["original", "second writer"]
+        assert analytics.get_snapshot(check)["total_word_count"] == 2
+    file_engine.dispose()
+
+def test_metrics_report_routes_queries_and_n_plus_one(client, db_session, monkeypatch, caplog):
+    from src import metrics
+
+    monkeypatch.setattr(settings, "metrics_n_plus_one_threshold", 3)
+    ids = [create_note(db_session, f"Note {i}", "content").id for i in range(4)]
+
+    @client.app.get("/test/n-plus-one")
+    def n_plus_one():
+        db_session.expire_all()
+        return [get_note(db_session, note_id).title for note_id in ids]
+
+    before = metrics.N_PLUS_ONE.get("/test/n-plus-one")
+    assert client.get(f"/notes/{ids[0]}").status_code == 200
+    assert client.get("/notes/999999").status_code == 404
+    with caplog.at_level("WARNING", logger="src.metrics"):
+        assert client.get("/test/n-plus-one").status_code == 200
+    assert metrics.N_PLUS_ONE.get("/test/n-plus-one") == before + 1
+    assert "Possible N+1" in caplog.text
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/notes/{note_id}"}' in body
+    assert 'http_requests_total{method="GET",route="/notes/{note_id}",status="404"}' in body
+    assert 'db_queries_per_request_count{route="/test/n-plus-one"}' in body
+    assert "note_cache_hit_ratio" in body
+
+def test_metrics_stop_at_response_not_background_tasks(client):
+    import time
+    from fastapi import BackgroundTasks
+    from src import metrics
+
+    @client.app.post("/test/background")
+    def with_background(background_tasks: BackgroundTasks):
+        background_tasks.add_task(time.sleep, 0.5)
+        return {"queued": True}
+
+    before = metrics.REQUEST_DURATION.total("POST", "/test/background")
+    in_flight = metrics.IN_FLIGHT.get()
+    assert client.post("/test/background").status_code == 200
+    assert metrics.REQUEST_DURATION.count("POST", "/test/background") == 1
+    assert metrics.REQUEST_DURATION.total("POST", "/test/background") - before < 0.25
+    assert metrics.IN_FLIGHT.get() == in_flight
+
+def test_metrics_disabled(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    app = create_app()
+    app.dependency_overrides[get_db] = lambda: db_session
+    assert TestClient(app).get("/metrics").status_code == 404
+
+def test_app_import_does_not_load_model_sdk():
+    import subprocess
+    import sys
+
+    probe = "import sys, main; print(any(m.startswith('google.generativeai') for m in sys.modules))"
+    env = {"PATH": "", "DATABASE_URL": "sqlite:///:memory:", "PYTHONPATH": "."}
+    result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+def test_ai_disabled_mode_serves_crud_and_analytics(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "model_provider", "none")
+    monkeypatch.setattr(services, "model", None)
+    services.summary_cache.clear()
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    note = create_note(db_session, "Plain", "crud only deployment")
+
+    assert client.get(f"/notes/{note.id}").status_code == 200
+    assert client.get("/analytics/").status_code == 200
+    summarize = client.post(f"/notes/{note.id}/summarize")
+    assert summarize.status_code == 503
+    assert client.post("/notes/summarize:batch", json={"ids": [note.id]}).status_code == 503
+    assert not services.genai.loaded
+
+def test_concurrent_summarize_requests_share_one_model_call(client, db_session, monkeypatch):
+    import httpx
+
+    model = FakeModel(latency=0.05)
+    monkeypatch.setattr(services, "get_gemini_model", lambda: model)
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    services.summary_cache.clear()
+    note = create_note(db_session, "Popular", "A note everyone wants summarized")
+
+    async def burst():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.post(f"/notes/{note.id}/summarize") for _ in range(10)))
+
+    responses = asyncio.run(burst())
+
+    assert [response.status_code for response in responses] == [200] * 10
+    assert len({response.json()["summary"] for response in responses}) == 1
+    assert model.calls == 1
+
+def test_summarize_rate_limited_returns_429(client, db_session, monkeypatch):
+    from src import llm
+
+    monkeypatch.setattr(services, "get_gemini_model", lambda: FakeModel())
+    monkeypatch.setattr(llm, "rate_limiter", llm.TokenBucket(rate=1 / 60, burst=0))
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    services.summary_cache.clear()
+    note = create_note(db_session, "Throttled", "Quota is exhausted")
+
+    response = client.post(f"/notes/{note.id}/summarize")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+
+def test_summarize_model_failure_is_not_404(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "model_max_retries", 0)
+    monkeypatch.setattr(services, "get_gemini_model", lambda: FakeModel(failures=1))
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    services.summary_cache.clear()
+    note = create_note(db_session, "Broken", "Upstream fails")
+
+    assert client.post(f"/notes/{note.id}/summarize").status_code == 502
+
+def _target_client(session_factory):
+    app = create_app()
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+
+    def override_get_db():
+        with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+@pytest.mark.parametrize("line, reason", [
+    ('{"type":"note","id":1,"content":"untitled"}', 'note "title" must be a string'),
+    ('{"type":"note","id":1,"title":"T","content":5}', 'note "content" must be a string'),
+    ('{"type":"note","id":"abc","title":"T","content":"x"}', 'note "id" must be an integer'),
+    ('{"type":"note","id":true,"title":"T","content":"x"}', 'note "id" must be an integer'),
+    ('{"type":"version","note_id":"1","revision":1,"content":"x"}', 'version "note_id" must be an integer'),
+])
+def test_import_rejects_mistyped_fields(line, reason):
+    target_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(target_engine)
+    target = _target_client(sessionmaker(bind=target_engine, autoflush=False))
+
+    response = target.post("/notes/import", content=line + "\n")
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith(f"Line 1: {reason};")
+    target_engine.dispose()
+
+def test_import_normalizes_timestamps_to_utc(db_session):
+    from src import rollups, transfer
+    from src.models import ImportCheckpoint
+
+    checkpoint = ImportCheckpoint(import_id="offset", lines=0, notes=0, versions=0)
+    db_session.add(checkpoint)
+    note = transfer.parse_record(
+        1, b'{"type":"note","id":1,"title":"T","content":"x","created_at":"2024-01-01T00:00:00+05:00"}'
+    )
+    transfer.import_batch(db_session, checkpoint, [(note, [])], 1)
+
+    assert get_note(db_session, 1).created_at == datetime.datetime(2023, 12, 31, 19)
+    points = rollups.timeseries(db_session, datetime.datetime(2023, 12, 31), datetime.datetime(2024, 1, 2), "day")
+    assert [point["notes_created"] for point in points] == [1, 0]
+
+def test_export_import_round_trip_with_versions(client, db_session, monkeypatch):
+    import gzip
+
+    monkeypatch.setattr(settings, "version_snapshot_interval", 2)
+    client.app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    first = create_note(db_session, "First", "alpha beta")
+    for content in ("alpha beta gamma", "alpha gamma", "delta"):
+        update_note(db_session, first.id, content)
+    create_note(db_session, "Second", "plain words")
+
+    plain = client.get("/notes/export", params={"versions": True}, headers={"Accept-Encoding": "identity"})
+    assert plain.headers["content-type"] == "application/x-ndjson"
+    assert [line.split(b'"type":')[1][:3] for line in plain.content.splitlines()] == [b'"no', b'"ve', b'"ve', b'"ve', b'"no']
+    compressed = client.get("/notes/export", params={"versions": True}, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.content == plain.content
+
+    target_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(target_engine)
+    Target = sessionmaker(bind=target_engine, autoflush=False)
+    target = _target_client(Target)
+    imported = target.post("/notes/import", content=gzip.compress(plain.content))
+    assert imported.status_code == 200
+    assert imported.json()["notes"] == 2 and imported.json()["versions"] == 3
+
+    with Target() as db:
+        copy = get_note(db, first.id)
+        assert (copy.content, copy.revision) == ("delta", 4)
+        assert [content for _, content in versions.history(db, copy)] == ["alpha beta", "alpha beta gamma", "alpha gamma"]
+        assert analytics.get_snapshot(db)["total_word_count"] == 3
+    assert target.get("/notes/search", params={"q": "plain"}).json()["items"][0]["title"] == "Second"
+    assert target.post("/notes/import", content=plain.content).status_code == 409
+    target_engine.dispose()
+
+def test_import_resumes_from_checkpoint(monkeypatch):
+    monkeypatch.setattr(settings, "import_batch_size", 2)
+    target_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(target_engine)
+    Target = sessionmaker(bind=target_engine, autoflush=False)
+    target = _target_client(Target)
+    lines = [f'{{"type":"note","id":{i},"title":"Note {i}","content":"words {i}"}}' for i in range(1, 6)]
+    broken = "\n".join(lines[:3] + ["{not json"] + lines[3:]) + "\n"
+
+    failed = target.post("/notes/import", params={"import_id": "nightly"}, content=broken)
+    assert failed.status_code == 400 and "Line 4" in failed.json()["detail"]
+    assert target.get("/notes/import/nightly").json()["lines"] == 2
+
+    fixed = "\n".join(lines[:3] + ['{"type":"note","id":6,"title":"Note 6","content":"words 6"}'] + lines[3:]) + "\n"
+    resumed = target.post("/notes/import", params={"import_id": "nightly"}, content=fixed)
+    assert resumed.json() == {"import_id": "nightly", "lines": 6, "notes": 6, "versions": 0, "skipped_lines": 2}
+    with Target() as db:
+        assert [note.id for note in get_all_notes(db)] == [1, 2, 3, 4, 5, 6]
+    target_engine.dispose()
+
+def test_similar_notes_and_duplicate_clusters(client, db_session):
+    base = " ".join(f"term{i}" for i in range(120))
+    original = create_note(db_session, "Original", base)
+    copy = create_note(db_session, "Copy", base.replace("term60 ", "edited "))
+    other = create_note(db_session, "Other", " ".join(f"word{i}" for i in range(120)))
+    crud.bulk_apply(db_session, [{"op": "create", "title": "Bulk copy", "content": base}])
+
+    similar = client.get(f"/notes/{original.id}/similar").json()["items"]
+    assert [item["title"] for item in similar] == ["Bulk copy", "Copy"]
+    assert similar[0]["similarity"] == 1.0 and similar[1]["similarity"] > 0.85
+    assert client.get(f"/notes/{other.id}/similar").json()["items"] == []
+    assert client.get("/notes/999/similar").status_code == 404
+
+    clusters = client.get("/analytics/duplicates").json()["clusters"]
+    assert len(clusters) == 1
+    assert [note["title"] for note in clusters[0]["notes"]] == ["Original", "Copy", "Bulk copy"]
+    assert clusters[0]["size"] == 3 and clusters[0]["min_similarity"] > 0.85
+
+    update_note(db_session, copy.id, " ".join(f"fresh{i}" for i in range(50)))
+    delete_note(db_session, other.id)
+    assert [item["title"] for item in client.get(f"/notes/{original.id}/similar").json()["items"]] == ["Bulk copy"]
+    assert client.get("/analytics/duplicates", params={"min_size": 3}).json()["clusters"] == []
+
+def test_similarity_ensure_index_backfills_existing_notes(db_session):
+    from src import similarity
+
+    db_session.execute(insert(Note), [{"title": "Old", "content": "same old words"}, {"title": "Dup", "content": "same old words"}])
+    db_session.commit()
+
+    assert similarity.ensure_index(db_session) is True
+    assert similarity.ensure_index(db_session) is False
+    assert [cluster["size"] for cluster in similarity.duplicate_clusters(db_session)] == [2]
+
+def test_timeseries_counts_writes_per_bucket(client, db_session):
+    note = create_note(db_session, "First", "alpha beta beta")
+    create_note(db_session, "Second", "beta gamma")
+    update_note(db_session, note.id, "alpha beta beta delta")
+    crud.bulk_apply(db_session, [{"op": "create", "title": "Bulk", "content": "gamma"}, {"op": "delete", "id": note.id}])
+
+    for bucket in ("hour", "day"):
+        response = client.get("/analytics/timeseries", params={"bucket": bucket, "top_words": 2})
+        assert response.status_code == 200
+        points = response.json()["points"]
+        assert len(points) == 30 and all(point["notes_created"] == 0 for point in points[:-1])
+        assert {key: points[-1][key] for key in ("notes_created", "notes_edited", "notes_deleted")} == {
+            "notes_created": 3, "notes_edited": 1, "notes_deleted": 1,
+        }
+        assert (points[-1]["words_added"], points[-1]["words_removed"]) == (7, 4)
+        assert points[-1]["top_words"] == [["beta", 3], ["gamma", 2]]
+
+    assert client.get("/analytics/timeseries", params={"from": "2024-01-01", "to": "2023-01-01"}).status_code == 422
+    assert client.get("/analytics/timeseries", params={"from": "2000-01-01", "bucket": "hour"}).status_code == 422
+
+def test_revision_only_updates_count_as_edits_on_both_paths(db_session):
+    from src import rollups
+
+    single = create_note(db_session, "Single", "same words")
+    bulk = create_note(db_session, "Bulk", "same words")
+    update_note(db_session, single.id, "same words")
+    crud.bulk_apply(db_session, [{"op": "update", "id": bulk.id, "content": "same words"}])
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    point = rollups.timeseries(db_session, now, now + datetime.timedelta(hours=1), "hour")[0]
+    assert (point["notes_created"], point["notes_edited"]) == (2, 2)
+
+def test_rollups_rebuild_and_compact(db_session):
+    from src import rollups
+    from src.models import AnalyticsRollup, RollupWord
+
+    old = datetime.datetime(2024, 1, 1, 9, 30)
+    db_session.execute(insert(Note), [
+        {"title": "Old", "content": "one two three", "created_at": old},
+        {"title": "Older", "content": "one four", "created_at": old - datetime.timedelta(hours=1)},
+    ])
+    db_session.commit()
+    assert rollups.ensure_backfill(db_session) is True
+    assert rollups.ensure_backfill(db_session) is False
+
+    day = rollups.timeseries(db_session, old, old + datetime.timedelta(hours=1), "day", top_words=1)
+    assert len(day) == 1 and day[0]["start"] == datetime.datetime(2024, 1, 1)
+    assert (day[0]["notes_created"], day[0]["words_added"], day[0]["top_words"]) == (2, 5, [("one", 2)])
+    # Hourly buckets past the retention are dropped; closed buckets keep their top words.
+    assert db_session.query(AnalyticsRollup).filter_by(granularity="hour").count() == 0
+    assert db_session.query(RollupWord).filter_by(granularity="day").count() == 4
+
+    assert rollups.compact(db_session, top_words=2) == {"hourly_deleted": 0, "buckets_trimmed": 1}
+    kept = db_session.query(RollupWord.word).filter_by(granularity="day").order_by(RollupWord.word).all()
+    assert [word for word, in kept] == ["four", "one"]
+
+def test_import_rolls_up_at_original_timestamps(db_session):
+    from src import rollups, transfer
+    from src.models import ImportCheckpoint
+
+    checkpoint = ImportCheckpoint(import_id="dated", lines=0, notes=0, versions=0)
+    db_session.add(checkpoint)
+    note = transfer.parse_record(1, b'{"type":"note","id":1,"title":"T","content":"new words","created_at":"2024-05-02T10:00:00"}')
+    version = transfer.parse_record(2, b'{"type":"version","note_id":1,"revision":1,"content":"old","created_at":"2024-05-01T08:00:00"}')
+    transfer.import_batch(db_session, checkpoint, [(note, [version])], 2)
+
+    points = rollups.timeseries(db_session, datetime.datetime(2024, 5, 1), datetime.datetime(2024, 5, 3), "day")
+    assert [(point["notes_created"], point["notes_edited"]) for point in points] == [(0, 1), (1, 0)]
+    assert points[1]["top_words"] == [("new", 1), ("words", 1)]
+
+def test_analytics_ensure_aggregates_backfills_existing_notes(db_session):
+    db_session.execute(insert(Note), [{"title": "Old", "content": "one two"}, {"title": "Older", "content": "two three"}])
+    db_session.commit()
+
+    assert analytics.ensure_aggregates(db_session) is True
+    assert analytics.ensure_aggregates(db_session) is False
+    snapshot = analytics.get_snapshot(db_session)
+    assert snapshot["total_word_count"] == 4
+    assert snapshot["most_common_words"][0] == ("two", 2)
+    assert [note.word_count for note in get_all_notes(db_session)] == [2, 2]
@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import os
 import unittest
 from sqlalchemy import create_engine
@@ -6,7 +8,13 @@ from datetime import datetime
 from src.crud import create_note, get_note, update_note, delete_note, get_all_notes
 from src.models import Note, NoteVersion, Base
 from unittest.mock import patch, MagicMock
-from src.services import analyze_notes, get_gemini_model, summarize_note
+from src import llm, rollups, similarity, versions
+from src.cache import FakeSharedCache, LRUCache, ReadThroughCache
+from src.chunking import split_text
+from src.config import settings
+from src.jobs import pack_notes, packed_prompt
+from src.llm import FakeModel, ModelCallError
+from src.services import analyze_notes, get_gemini_model, summarize_note_async, summary_cache
 
 
 class TestNoteFunctions(unittest.TestCase):
@@ -71,7 +79,7 @@ class TestNoteFunctions(unittest.TestCase):
         self.assertIsNotNone(updated_note.updated_at)
         self.assertIsInstance(updated_note.updated_at, datetime)
         self.assertIsInstance(self.db_mock.add.call_args[0][0], NoteVersion)
-        self.assertEqual(self.db_mock.add.call_args[0][0].content, initial_content)
+        self.assertEqual(versions.version_text(self.db_mock.add.call_args[0][0], new_content), initial_content)
         self.assertEqual(self.db_mock.add.call_args[0][0].note_id, note_id)
 
     def test_update_note_not_found(self):
@@ -190,6 +198,11 @@ class TestNoteAndNoteVersion(unittest.TestCase):
 class TestGeminiFunctions(unittest.TestCase):
     def setUp(self):
         self.db_mock = MagicMock(spec=Session)
+        summary_cache.clear()
+        for target in ('src.crud.get_cached_summary', 'src.crud.save_summary'):
+            patcher = patch(target, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
     @patch.dict(os.environ, {"GEMINI_API_KEY": "test_api_key"})
     @patch('src.services.genai')
@@ -217,54 +230,49 @@ class TestGeminiFunctions(unittest.TestCase):
             get_gemini_model()
         self.assertEqual(str(context.exception), "GEMINI_API_KEY environment variable not set.")
 
-    @patch.dict(os.environ, {"GEMINI_API_KEY": "test_api_key"})
-    @patch('src.services.genai')
+    def summarize(self, note_id):
+        return asyncio.run(summarize_note_async(note_id, lambda: contextlib.nullcontext(self.db_mock)))
+
     @patch('src.crud.get_note')
-    def test_summarize_note_success(self, mock_get_note, mock_genai):
+    def test_summarize_note_success(self, mock_get_note):
         mock_note = {"id": 1, "content": "This is a test note."}
         mock_get_note.return_value = type('Note', (object,), mock_note)
-        mock_model = MagicMock()
+        mock_model = MagicMock(spec=["generate_content"])
         mock_response = MagicMock()
         mock_response.text = "Test summary"
         mock_model.generate_content.return_value = mock_response
-        mock_genai.GenerativeModel.return_value = mock_model
 
         with patch('src.services.get_gemini_model', return_value=mock_model):
-            summary = summarize_note(self.db_mock, 1)
+            summary = self.summarize(1)
 
         self.assertEqual(summary, "Test summary")
         mock_model.generate_content.assert_called_once_with("Summarize the following note: This is a test note.")
 
-    @patch.dict(os.environ, {"GEMINI_API_KEY": "test_api_key"})
-    @patch('src.services.genai')
     @patch('src.crud.get_note')
-    def test_summarize_note_note_not_found(self, mock_get_note, mock_genai):
+    def test_summarize_note_note_not_found(self, mock_get_note):
         mock_get_note.return_value = None
-        mock_model = MagicMock()
-        mock_genai.GenerativeModel.return_value = mock_model
+        mock_model = MagicMock(spec=["generate_content"])
 
         with patch('src.services.get_gemini_model', return_value=mock_model):
-            summary = summarize_note(self.db_mock, 1)
+            summary = self.summarize(1)
 
         self.assertIsNone(summary)
+        mock_model.generate_content.assert_not_called()
 
-    @patch.dict(os.environ, {"GEMINI_API_KEY": "test_api_key"})
-    @patch('src.services.genai')
     @patch('src.crud.get_note')
-    def test_summarize_note_error(self, mock_get_note, mock_genai):
+    def test_summarize_note_error(self, mock_get_note):
         mock_note = {"id": 1, "content": "This is a test note."}
         mock_get_note.return_value = type('Note', (object,), mock_note)
-        mock_model = MagicMock()
+        mock_model = MagicMock(spec=["generate_content"])
         mock_model.generate_content.side_effect = Exception("Test error")
-        mock_genai.GenerativeModel.return_value = mock_model
-
-        with patch('src.services.get_gemini_model', return_value=mock_model):
-            summary = summarize_note(self.db_mock, 1)
 
-        self.assertIsNone(summary)
+        with patch('src.services.get_gemini_model', return_value=mock_model), \
+                patch.object(settings, "model_max_retries", 0):
+            with self.assertRaises(ModelCallError):
+                self.summarize(1)
 
-    @patch('src.crud.get_all_notes')
-    def test_analyze_notes_success(self, mock_get_all_notes):
+    @patch('src.crud.iter_note_contents')
+    def test_analyze_notes_success(self, mock_iter_note_contents):
         mock_notes = [
             {"id": 1, "content": "This is the first note."},
             {"id": 2, "content": "This is the second longer note."},
@@ -272,9 +280,9 @@ class TestGeminiFunctions(unittest.TestCase):
             {"id": 4, "content": "Another very very very long note."},
             {"id": 5, "content": "Another note."},
         ]
-        mock_get_all_notes.return_value = [type('Note', (object,), note) for note in mock_notes]
+        mock_iter_note_contents.return_value = iter([(note["id"], note["content"]) for note in mock_notes])
 
-        analytics = analyze_notes(self.db_mock)
+        analytics = analyze_notes(self.db_mock, mode="scan")
         print("Top 3 longest notes:", analytics["top_3_longest_notes"])
 
         self.assertIsNotNone(analytics)
@@ -283,14 +291,269 @@ class TestGeminiFunctions(unittest.TestCase):
         self.assertEqual(analytics["most_common_words"][0][0], "note.")
         self.assertEqual(analytics["top_3_longest_notes"][0]["id"], 2)
         self.assertEqual(analytics["top_3_shortest_notes"][0]["id"], 3)
+        self.assertEqual([note["id"] for note in analytics["top_3_longest_notes"]], [2, 4, 1])
+        self.assertEqual([note["id"] for note in analytics["top_3_shortest_notes"]], [3, 5, 1])
 
-    @patch('src.crud.get_all_notes')
-    def test_analyze_notes_no_notes(self, mock_get_all_notes):
-        mock_get_all_notes.return_value = []
+    @patch('src.crud.iter_note_contents')
+    def test_analyze_notes_no_notes(self, mock_iter_note_contents):
+        mock_iter_note_contents.return_value = iter([])
 
-        analytics = analyze_notes(self.db_mock)
+        analytics = analyze_notes(self.db_mock, mode="scan")
 
         self.assertIsNone(analytics)
 
+class TestModelCalls(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("model_concurrency", 2), ("model_backoff_base", 0.001), ("model_backoff_max", 0.01)):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrency_is_bounded(self):
+        model = FakeModel(latency=0.02)
+
+        async def run():
+            return await asyncio.gather(*(llm.generate(model, f"prompt {i}") for i in range(6)))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(model.max_in_flight, 2)
+
+    def test_retries_transient_failures(self):
+        model = FakeModel(failures=2)
+
+        summary = asyncio.run(llm.generate(model, "a short prompt", retries=2))
+
+        self.assertEqual(summary, "a short prompt")
+        self.assertEqual(model.calls, 3)
+
+    def test_timeout_raises_after_retries(self):
+        model = FakeModel(latency=1)
+
+        with self.assertRaises(ModelCallError):
+            asyncio.run(llm.generate(model, "slow", timeout=0.01, retries=1))
+
+    def test_sync_only_model_runs_in_thread(self):
+        model = MagicMock(spec=["generate_content"])
+        model.generate_content.return_value.text = " done "
+
+        self.assertEqual(asyncio.run(llm.generate(model, "prompt")), "done")
+
+
+class TestRateLimitAndSingleFlight(unittest.TestCase):
+    def test_token_bucket_queues_then_rejects(self):
+        now = [0.0]
+        bucket = llm.TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+
+        self.assertEqual([bucket.reserve(), bucket.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(max_wait=1), 0.5)
+        with self.assertRaises(llm.RateLimited) as raised:
+            bucket.reserve(max_wait=0.5)
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+        now[0] = 1.0
+        self.assertEqual(bucket.reserve(max_wait=0), 0.0)
+        self.assertEqual(bucket.rejected, 1)
+
+    def test_disabled_bucket_never_waits(self):
+        bucket = llm.TokenBucket(rate=0, burst=0)
+
+        self.assertEqual(bucket.reserve(max_wait=0), 0.0)
+
+    def test_single_flight_shares_one_call(self):
+        flight = llm.SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            first = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+            return first, await flight.do("key", work)
+
+        first, later = asyncio.run(run())
+
+        self.assertEqual(first, ["result"] * 5)
+        self.assertEqual(later, "result")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.shared, 4)
+
+class TestSummaryJobs(unittest.TestCase):
+    @patch.object(settings, "batch_pack_max_chars", 100)
+    @patch.object(settings, "batch_pack_max_notes", 3)
+    def test_pack_notes(self):
+        pending = [(i, "x" * length, None) for i, length in enumerate([10, 20, 80, 30, 40, 5, 5, 5])]
+
+        groups = pack_notes(pending)
+
+        self.assertEqual([[item[0] for item in group] for group in groups], [[2], [0, 1, 3], [4, 5, 6], [7]])
+
+    def test_packed_prompt_lists_each_note(self):
+        prompt = packed_prompt([(1, "first\nnote", None), (2, "second", None)])
+
+        self.assertIn("[1] first note\n[2] second", prompt)
+
+
+class TestChunking(unittest.TestCase):
+    def test_chunks_respect_limit_and_keep_text(self):
+        text = "\n\n".join(
+            ["Short paragraph.", "A much longer paragraph. " * 20, "x" * 250, "Tail paragraph."]
+        )
+
+        chunks = split_text(text, 100)
+
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual("".join(text.split()), "".join("".join(chunks).split()))
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_text("one\n\ntwo", 100), ["one\n\ntwo"])
+
+    def test_boundaries_do_not_cut_below_the_floor(self):
+        text = "\n\n".join(f"Paragraph {i} about topic {i * 7}." for i in range(520))
+
+        chunks = split_text(text, 12000)
+
+        self.assertLessEqual(len(chunks), 3)
+        self.assertTrue(all(len(chunk) >= 6000 for chunk in chunks[:-1]))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(maxsize=0)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_expire_after_ttl(self):
+        now = [0.0]
+        cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", 1)
+        now[0] = 9.9
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+
+class TestReadThroughCache(unittest.TestCase):
+    def test_shared_backend_fills_other_processes(self):
+        shared = FakeSharedCache()
+        first = ReadThroughCache(LRUCache(maxsize=10), shared)
+        second = ReadThroughCache(LRUCache(maxsize=10), shared)
+        first.set("note:1", b"{}")
+
+        self.assertEqual(second.get("note:1"), b"{}")
+        self.assertEqual(second.get("note:1"), b"{}")
+        self.assertEqual(second.stats()["shared_hits"], 1)
+        self.assertEqual(second.stats()["hits"], 1)
+
+    def test_delete_reaches_shared_backend(self):
+        shared = FakeSharedCache()
+        first = ReadThroughCache(LRUCache(maxsize=10), shared)
+        second = ReadThroughCache(LRUCache(maxsize=10), shared)
+        first.set("note:1", b"{}")
+        first.delete("note:1")
+
+        self.assertIsNone(first.get("note:1"))
+        self.assertIsNone(second.get("note:1"))
+        self.assertEqual(second.stats()["shared_misses"], 1)
+
+
+class TestMinHash(unittest.TestCase):
+    def test_estimate_tracks_jaccard_similarity(self):
+        base = " ".join(f"word{i}" for i in range(200))
+        edited = base.replace("word100 ", "changed ")
+        unrelated = " ".join(f"other{i}" for i in range(200))
+
+        sig = similarity.signature(base)
+
+        self.assertEqual(similarity.estimate(sig, similarity.signature(base.upper())), 1.0)
+        self.assertGreater(similarity.estimate(sig, similarity.signature(edited)), 0.85)
+        self.assertLess(similarity.estimate(sig, similarity.signature(unrelated)), 0.1)
+        self.assertIsNone(similarity.signature("   "))
+
+    def test_identical_content_shares_every_band(self):
+        keys = similarity.band_keys(similarity.signature("one two three four"))
+
+        self.assertEqual(len(keys), similarity.BANDS)
+        self.assertEqual(keys, similarity.band_keys(similarity.signature("one  two three four")))
+
+class TestSyncIdSequence(unittest.TestCase):
+    def test_sets_postgresql_sequence_to_max_id(self):
+        from sqlalchemy.dialects import postgresql
+        from src.database import sync_id_sequence
+
+        db = MagicMock(spec=Session)
+        db.get_bind.return_value.dialect.name = "postgresql"
+        sync_id_sequence(db, Note.__table__)
+
+        statement = str(db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn("setval(pg_get_serial_sequence(", statement)
+        self.assertIn("max(notes.id)", statement)
+
+    def test_sqlite_needs_nothing(self):
+        from src.database import sync_id_sequence
+
+        db = MagicMock(spec=Session)
+        db.get_bind.return_value.dialect.name = "sqlite"
+        sync_id_sequence(db, Note.__table__)
+
+        db.execute.assert_not_called()
+
+class TestRollupBuckets(unittest.TestCase):
+    def test_bucket_start_is_naive_utc(self):
+        moment = datetime.fromisoformat("2024-03-05T01:45:10+02:00")
+
+        self.assertEqual(rollups.bucket_start(moment, "hour"), datetime(2024, 3, 4, 23))
+        self.assertEqual(rollups.bucket_start(moment, "day"), datetime(2024, 3, 4))
+        self.assertEqual(rollups.bucket_start(datetime(2024, 3, 4, 23, 59), "hour"), datetime(2024, 3, 4, 23))
+
+    def test_timestamp_defaults_are_evaluated_per_row(self):
+        for column in (Note.created_at, Note.updated_at, NoteVersion.created_at):
+            self.assertTrue(column.default.is_callable)
+
+class TestVersionDeltas(unittest.TestCase):
+    def test_delta_round_trip(self):
+        old = "  The quick brown fox\njumps over\n\nthe lazy dog. "
+        new = "The quick red fox\njumps over\n\nthe lazy dog again."
+
+        self.assertEqual(versions.apply_delta(new, versions.encode_delta(new, old)), old)
+        self.assertEqual(versions.apply_delta(old, versions.encode_delta(old, "")), "")
+
+    def test_small_edit_to_large_note_stores_small_delta(self):
+        old = " ".join(f"word{i}" for i in range(5000))
+        new = old.replace("word2500", "edited")
+
+        row = versions.version_row(1, 1, old, new)
+        self.assertFalse(row["is_snapshot"])
+        self.assertLess(len(row["delta"]), len(versions.compress(old)) / 10)
+
+    def test_snapshot_every_interval(self):
+        interval = settings.version_snapshot_interval
+        old = " ".join(f"word{i}" for i in range(500))
+        new = old + " more"
+
+        self.assertTrue(versions.version_row(1, interval, old, new)["is_snapshot"])
+        self.assertFalse(versions.version_row(1, interval + 1, old, new)["is_snapshot"])
+        self.assertEqual(versions.decompress(versions.version_row(1, interval, old, new)["delta"]), old)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file